@@ -11,6 +11,7 @@ import hashlib
 import requests
 import argparse
 import logging
+import logging.handlers
 from datetime import datetime, timedelta
 from typing import List, Tuple, Optional, Dict
 import os
@@ -20,7 +21,7 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('akari_generator_api.log'),
+        logging.handlers.RotatingFileHandler('akari_generator_api.log', maxBytes=5_000_000, backupCount=3),
         logging.StreamHandler()
     ]
 )
@@ -382,12 +383,17 @@ class AkariPuzzleGeneratorAPI:
         
         return results
     
-    def generate_ebook_puzzles(self, sizes: List[int], count_per_size: int = 20) -> List[Dict]:
+    def generate_ebook_puzzles(self, sizes: List[int], count_per_size: int = 20,
+                               difficulties: Optional[List[str]] = None) -> List[Dict]:
         """Generate puzzles specifically for ebooks (no API send)"""
         ebook_puzzles = []
         
+        # Only generate the difficulties that will actually be used
+        if difficulties is None:
+            difficulties = ['easy', 'medium', 'hard']
+        
         for size in sizes:
-            for difficulty in ['easy', 'medium', 'hard']:
+            for difficulty in difficulties:
                 logging.info(f"Generating {count_per_size} {difficulty} {size}x{size} puzzles for ebook...")
                 
                 for i in range(count_per_size):
@@ -6,10 +6,12 @@ Automatically uploads generated PDFs to CDN Bunny for distribution
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, Optional, Union
 import argparse
 
 # Configure logging
@@ -52,6 +54,12 @@ class CDNBunnyUploader:
         self.upload_headers = {
             'AccessKey': password
         }
+        
+        # One pooled session per uploader keeps the TLS connection to bunny.net warm
+        self.session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retries)
+        self.session.mount('https://', adapter)
     
     def upload_file(self, local_path: str, remote_path: str) -> Dict:
         """Upload a file to CDN Bunny"""
@@ -62,17 +70,27 @@ class CDNBunnyUploader:
                     'error': f'File not found: {local_path}'
                 }
             
-            # Read file content
+            # Stream the file into the request body instead of reading it all first
             with open(local_path, 'rb') as f:
-                file_content = f.read()
-            
+                return self.upload_stream(f, remote_path)
+                
+        except Exception as e:
+            logging.error(f"Upload error: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Upload exception: {str(e)}'
+            }
+    
+    def upload_stream(self, stream: BinaryIO, remote_path: str) -> Dict:
+        """Upload the contents of a seekable binary stream to CDN Bunny"""
+        try:
             # Upload URL
             upload_url = f"{self.base_url}/{remote_path}"
             
-            # Upload file
-            response = requests.put(
+            # Upload from the current position; requests sends it in chunks
+            response = self.session.put(
                 upload_url,
-                data=file_content,
+                data=stream,
                 headers=self.upload_headers,
                 timeout=60
             )
@@ -107,7 +125,7 @@ class CDNBunnyUploader:
         """Get information about an uploaded file"""
         try:
             url = f"{self.base_url}/{remote_path}"
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self.session.get(url, headers=self.headers, timeout=30)
             
             if response.status_code == 200:
                 return response.json()
@@ -123,7 +141,7 @@ class CDNBunnyUploader:
         """List files in a directory"""
         try:
             url = f"{self.base_url}/{path}"
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self.session.get(url, headers=self.headers, timeout=30)
             
             if response.status_code == 200:
                 return {
@@ -146,7 +164,7 @@ class CDNBunnyUploader:
         """Delete a file from CDN Bunny"""
         try:
             url = f"{self.base_url}/{remote_path}"
-            response = requests.delete(url, headers=self.headers, timeout=30)
+            response = self.session.delete(url, headers=self.headers, timeout=30)
             
             if response.status_code == 200:
                 return {
@@ -165,8 +183,8 @@ class CDNBunnyUploader:
                 'error': f'Delete exception: {str(e)}'
             }
     
-    def upload_ebook(self, pdf_path: str, title: str = None) -> Dict:
-        """Upload an ebook PDF with proper naming and metadata"""
+    def upload_ebook(self, pdf: Union[str, BinaryIO], title: str = None) -> Dict:
+        """Upload an ebook PDF (a path or a binary stream) with proper naming and metadata"""
         try:
             # Generate filename
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -181,15 +199,22 @@ class CDNBunnyUploader:
             # Remote path
             remote_path = f"ebooks/{filename}"
             
-            # Upload file
-            result = self.upload_file(pdf_path, remote_path)
+            # Upload file (or an in-memory PDF, without touching the disk)
+            if isinstance(pdf, str):
+                result = self.upload_file(pdf, remote_path)
+                file_size = os.path.getsize(pdf) if result['success'] else 0
+            else:
+                start = pdf.tell()
+                file_size = pdf.seek(0, os.SEEK_END) - start
+                pdf.seek(start)
+                result = self.upload_stream(pdf, remote_path)
             
             if result['success']:
                 # Add metadata
                 metadata = {
                     'title': title or 'Akari Puzzle Collection',
                     'uploaded_at': datetime.now().isoformat(),
-                    'file_size': os.path.getsize(pdf_path),
+                    'file_size': file_size,
                     'cdn_url': result['file_url']
                 }
                 
@@ -214,7 +239,7 @@ class CDNBunnyUploader:
             metadata_json = json.dumps(metadata, indent=2)
             
             url = f"{self.base_url}/{remote_path}"
-            response = requests.put(
+            response = self.session.put(
                 url,
                 data=metadata_json.encode('utf-8'),
                 headers=self.upload_headers,
@@ -7,7 +7,7 @@ Creates beautiful, zen-like Japanese PDF ebooks with puzzles and solutions
 import json
 import argparse
 from datetime import datetime
-from typing import List, Dict
+from typing import BinaryIO, List, Dict, Union
 import os
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image, HRFlowable
@@ -96,8 +96,8 @@ class EbookGenerator:
         
         return style
     
-    def generate_ebook(self, puzzles: List[Dict], output_file: str, title: str = "Akari Puzzle Collection"):
-        """Generate a beautiful PDF ebook with zen-like Japanese aesthetic"""
+    def generate_ebook(self, puzzles: List[Dict], output_file: Union[str, BinaryIO], title: str = "Akari Puzzle Collection"):
+        """Generate a beautiful PDF ebook (to a path or a binary stream) with zen-like Japanese aesthetic"""
         doc = SimpleDocTemplate(output_file, pagesize=A4, 
                               leftMargin=1*inch, rightMargin=1*inch,
                               topMargin=1*inch, bottomMargin=1*inch)
@@ -278,7 +278,10 @@ class EbookGenerator:
         
         # Build PDF
         doc.build(story)
-        print(f"✨ Beautiful zen ebook generated: {output_file}")
+        if isinstance(output_file, str):
+            print(f"✨ Beautiful zen ebook generated: {output_file}")
+        else:
+            print("✨ Beautiful zen ebook generated in memory")
 
 def main():
     parser = argparse.ArgumentParser(description='Generate beautiful Akari puzzle ebooks')
@@ -305,10 +308,8 @@ def main():
     
     # Generate puzzles for ebook using API version
     print(f"🎯 Generating {args.count} puzzles per size/difficulty combination...")
-    puzzles = generator.puzzle_generator.generate_ebook_puzzles(args.sizes, args.count)
-    
-    # Filter by difficulties
-    puzzles = [p for p in puzzles if p['difficulty'] in args.difficulties]
+    puzzles = generator.puzzle_generator.generate_ebook_puzzles(args.sizes, args.count,
+                                                                difficulties=args.difficulties)
     
     print(f"✨ Generated {len(puzzles)} puzzles for zen ebook")
     
@@ -7,13 +7,28 @@ Integrates with Raspberry Pi setup and includes advanced print optimization
 import json
 import argparse
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import os
 from pathlib import Path
 import subprocess
 import webbrowser
 from akari_generator_api import AkariPuzzleGeneratorAPI
 
+# Buffer for ebook output: a few large writes to disk rather than many small ones
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Cell markup by layout value, so each cell is one dict lookup instead of a chain of
+# comparisons; numbered walls are added on first use
+_NUMBER_CELL_HTML = '    <div class="cell wall number" data-value="%s">%s</div>\n'
+_PUZZLE_CELL_HTML = {
+    0: '    <div class="cell empty"></div>\n',
+    'X': '    <div class="cell wall"></div>\n',
+}
+_SOLUTION_CELL_HTML = {
+    0: '    <div class="cell empty solution-cell"></div>\n',
+    'X': '    <div class="cell wall"></div>\n',
+}
+
 class EnhancedHTMLEbookGenerator:
     def __init__(self, config: Dict):
         self.config = config
@@ -39,6 +54,8 @@ class EnhancedHTMLEbookGenerator:
             'print_bg': '#ffffff',     # Pure white for print
             'print_text': '#000000',   # Pure black for print
         }
+        # Built stylesheets keyed by (print flag, palette), so a warm generator formats the CSS once
+        self._css_cache = {}
         
     def create_puzzle_grid_html(self, layout: List[List], size: int, puzzle_num: int, is_solution: bool = False) -> str:
         """Convert puzzle layout to HTML grid with enhanced zen styling"""
@@ -52,16 +69,12 @@ class EnhancedHTMLEbookGenerator:
         html += '  </div>\n'
         
         # Add rows with row numbers
+        cell_html = _PUZZLE_CELL_HTML
         for i, row in enumerate(layout):
             html += f'  <div class="grid-row">\n'
             html += f'    <div class="row-header">{i + 1}</div>\n'
-            for j, cell in enumerate(row):
-                if cell == 0:
-                    html += '    <div class="cell empty"></div>\n'
-                elif cell == 'X':
-                    html += '    <div class="cell wall"></div>\n'
-                else:
-                    html += f'    <div class="cell wall number" data-value="{cell}">{cell}</div>\n'
+            for cell in row:
+                html += cell_html.get(cell) or cell_html.setdefault(cell, _NUMBER_CELL_HTML % (cell, cell))
             html += '  </div>\n'
         
         html += '</div>'
@@ -79,24 +92,29 @@ class EnhancedHTMLEbookGenerator:
         html += '  </div>\n'
         
         # Add empty rows with enhanced styling
+        cell_html = _SOLUTION_CELL_HTML
         for i in range(size):
             html += f'  <div class="grid-row">\n'
             html += f'    <div class="row-header">{i + 1}</div>\n'
+            # Walls and numbers come from the original layout; the rest is left empty
+            row = layout[i]
             for j in range(size):
-                # Check if this cell should be a wall based on original layout
-                original_cell = layout[i][j]
-                if original_cell == 'X':
-                    html += '    <div class="cell wall"></div>\n'
-                elif original_cell != 0:
-                    html += f'    <div class="cell wall number" data-value="{original_cell}">{original_cell}</div>\n'
-                else:
-                    html += '    <div class="cell empty solution-cell"></div>\n'
+                cell = row[j]
+                html += cell_html.get(cell) or cell_html.setdefault(cell, _NUMBER_CELL_HTML % (cell, cell))
             html += '  </div>\n'
         
         html += '</div>'
         return html
     
     def generate_enhanced_css(self, include_print_optimization: bool = True) -> str:
+        """Enhanced zen-like CSS, built once per palette and then served from the cache"""
+        key = (include_print_optimization, tuple(self.colors.items()))
+        css = self._css_cache.get(key)
+        if css is None:
+            css = self._css_cache[key] = self._build_enhanced_css(include_print_optimization)
+        return css
+    
+    def _build_enhanced_css(self, include_print_optimization: bool = True) -> str:
         """Generate enhanced zen-like CSS with advanced print styling"""
         css = f"""
 /* Enhanced Zen-like Akari Puzzle Ebook Styles */
@@ -653,11 +671,30 @@ p {{
                       auto_open: bool = False, include_print_button: bool = True):
         """Generate a beautiful HTML ebook with enhanced zen-like Japanese aesthetic"""
         
+        # Sections go straight into a large file buffer instead of one growing string
+        with open(output_file, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+            self.write_ebook(f.write, puzzles, title, include_print_button)
+        
+        print(f"✨ Enhanced zen HTML ebook generated: {output_file}")
+        print(f"📄 Open in browser and press Ctrl+P to print as PDF")
+        
+        # Auto-open in browser if requested
+        if auto_open:
+            try:
+                webbrowser.open(f'file://{os.path.abspath(output_file)}')
+                print(f"🌐 Opened {output_file} in browser")
+            except Exception as e:
+                print(f"⚠️  Could not auto-open browser: {e}")
+    
+    def write_ebook(self, write: Callable[[str], object], puzzles: List[Dict],
+                    title: str = "Akari: Zen Logic Puzzles", include_print_button: bool = True):
+        """Render the ebook HTML section by section through write (e.g. a file's write)"""
+        
         # Generate CSS
         css = self.generate_enhanced_css()
         
         # Start HTML
-        html = f"""<!DOCTYPE html>
+        write(f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -701,19 +738,19 @@ p {{
     <section class="toc">
         <h2>Contents</h2>
         <div class="toc-list">
-"""
+""")
         
         # Table of contents
         for i, puzzle in enumerate(puzzles, 1):
-            html += f"""
+            write(f"""
             <div class="toc-item">
                 <span class="toc-number">{i}</span>
                 <span class="toc-title">{puzzle['size']}×{puzzle['size']} {puzzle['difficulty'].title()} Puzzle</span>
                 <span class="toc-difficulty">{puzzle['difficulty'].title()}</span>
             </div>
-"""
+""")
         
-        html += """
+        write("""
         </div>
     </section>
     
@@ -721,14 +758,14 @@ p {{
     
     <section class="puzzle-section">
         <h2>Puzzles</h2>
-"""
+""")
         
         # Puzzles section
         for i, puzzle in enumerate(puzzles, 1):
             size = puzzle['size']
             layout = puzzle['layout']
             
-            html += f"""
+            write(f"""
         <div class="puzzle-container">
             <div class="puzzle-header">
                 <h3>Puzzle {i}: {size}×{size} {puzzle['difficulty'].title()}</h3>
@@ -748,23 +785,23 @@ p {{
         </div>
         
         <div class="page-break"></div>
-"""
+""")
         
-        html += """
+        write("""
     </section>
     
     <div class="zen-divider"></div>
     
     <section class="puzzle-section">
         <h2>Solutions</h2>
-"""
+""")
         
         # Solutions section
         for i, puzzle in enumerate(puzzles, 1):
             size = puzzle['size']
             layout = puzzle['layout']
             
-            html += f"""
+            write(f"""
         <div class="puzzle-container">
             <div class="puzzle-header">
                 <h3>Solution {i}: {size}×{size} {puzzle['difficulty'].title()}</h3>
@@ -776,9 +813,9 @@ p {{
         </div>
         
         <div class="page-break"></div>
-"""
+""")
         
-        html += """
+        write("""
     </section>
     
     <footer style="text-align: center; margin-top: 3rem; padding-top: 2rem; border-top: 1px solid var(--grid-line); color: var(--text-muted);">
@@ -841,22 +878,7 @@ p {{
     </script>
 </body>
 </html>
-"""
-        
-        # Write to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
-        
-        print(f"✨ Enhanced zen HTML ebook generated: {output_file}")
-        print(f"📄 Open in browser and press Ctrl+P to print as PDF")
-        
-        # Auto-open in browser if requested
-        if auto_open:
-            try:
-                webbrowser.open(f'file://{os.path.abspath(output_file)}')
-                print(f"🌐 Opened {output_file} in browser")
-            except Exception as e:
-                print(f"⚠️  Could not auto-open browser: {e}")
+""")
 
 def main():
     parser = argparse.ArgumentParser(description='Generate enhanced Akari puzzle HTML ebooks')
@@ -887,10 +909,8 @@ def main():
     
     # Generate puzzles for ebook
     print(f"🎯 Generating {args.count} puzzles per size/difficulty combination...")
-    puzzles = generator.puzzle_generator.generate_ebook_puzzles(args.sizes, args.count)
-    
-    # Filter by difficulties
-    puzzles = [p for p in puzzles if p['difficulty'] in args.difficulties]
+    puzzles = generator.puzzle_generator.generate_ebook_puzzles(args.sizes, args.count,
+                                                                difficulties=args.difficulties)
     
     print(f"✨ Generated {len(puzzles)} puzzles for enhanced zen HTML ebook")
     
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Shared HTML ebook helpers
+Logging and output file naming used by the HTML ebook API server and the
+integration CLI
+"""
+
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import time
+
+# Characters kept in ebook file names: letters, digits (Unicode, like str.isalnum), space, - and _
+_SAFE_TITLE_RE = re.compile(r'[^\w -]+')
+
+def safe_title(title: str) -> str:
+    """title reduced to a file name part: unsafe characters dropped, spaces as underscores"""
+    return _SAFE_TITLE_RE.sub('', title).rstrip().replace(' ', '_')
+
+class SecondCachedFormatter(logging.Formatter):
+    """Formatter that runs strftime once per second rather than once per record"""
+    
+    _cached = (None, '')
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, stamp = self._cached
+        if second != cached_second:
+            stamp = time.strftime(datefmt or self.default_time_format, self.converter(second))
+            self._cached = (second, stamp)
+        return stamp
+
+def create_file_logger(name: str, log_file: str) -> logging.Logger:
+    """Logger that echoes to stdout and appends to log_file through one open, rotating handle.
+
+    Only one process may write a given log_file: rotation renames it under any other writer."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        # One formatter for both handlers, so each record's timestamp is formatted once
+        formatter = SecondCachedFormatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S')
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024,
+                                                       backupCount=3, encoding='utf-8')
+        console = logging.StreamHandler(sys.stdout)
+        for h in (handler, console):
+            h.setFormatter(formatter)
+            logger.addHandler(h)
+        logger.setLevel(logging.INFO)
+        # Keep these lines out of the root logger's handlers
+        logger.propagate = False
+    return logger
@@ -5,12 +5,474 @@ Creates beautiful, zen-like Japanese HTML ebooks with CSS print styling
 """
 
 import json
+import hashlib
 import argparse
 from datetime import datetime
-from typing import List, Dict
+from html import escape
+from typing import List, Dict, Optional
 import os
+import re
 from pathlib import Path
+from functools import lru_cache
 from akari_generator_api import AkariPuzzleGeneratorAPI
+import puzzle_pool
+
+# Column letters (A, B, C, ...) for grid headers
+_COL_LETTERS = tuple(chr(65 + i) for i in range(64))
+
+# Stylesheets shared by every ebook written to the same directory
+CSS_FILENAME = 'akari_ebook.css'
+PRINT_CSS_FILENAME = 'akari_ebook.print.css'
+RESPONSIVE_CSS_FILENAME = 'akari_ebook.responsive.css'
+DARK_CSS_FILENAME = 'akari_ebook.dark.css'
+
+# Write-time minification (scripts are left untouched, their // comments need newlines)
+_SCRIPT_RE = re.compile(r'(<script\b.*?</script>)', re.S | re.I)
+_HTML_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.S)
+_TAG_GAP_RE = re.compile(r'>\s*\n\s*<')
+_LINE_BREAK_RE = re.compile(r'\s*\n\s*')
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON_RE = re.compile(r':\s+')
+
+def _minify_css(css: str) -> str:
+    """Drop comments and collapse whitespace in a stylesheet"""
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = _CSS_SPACE_RE.sub(' ', css)
+    css = _CSS_PUNCT_RE.sub(r'\1', css)
+    css = _CSS_COLON_RE.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+def _minify_html(html: str) -> str:
+    """Drop comments and whitespace between block-level lines, leaving scripts as-is"""
+    parts = _SCRIPT_RE.split(html)
+    for i in range(0, len(parts), 2):
+        part = _HTML_COMMENT_RE.sub('', parts[i])
+        part = _TAG_GAP_RE.sub('><', part)
+        parts[i] = _LINE_BREAK_RE.sub(' ', part)
+    return ''.join(parts).strip()
+
+# Side length of one cell in SVG grids (user units, rendered as px)
+_SVG_CELL = 40
+
+# Small markup templates for the per-row/per-cell paths, filled with % (cheaper than f-strings there)
+_HEADER_CELL_HTML = '    <div class="header-cell">%s</div>\n'
+_ROW_OPEN_HTML = '  <div class="grid-row">\n    <div class="row-header">%d</div>\n'
+_NUMBER_CELL_HTML = '    <div class="cell wall number" data-value="%s">%s</div>\n'
+_PUZZLE_GRID_OPEN = '<div class="puzzle-grid">\n'
+_SOLUTION_GRID_OPEN = '<div class="solution-grid">\n'
+_PUZZLE_SVG_OPEN = '<svg class="grid-svg puzzle-grid-svg" '
+_SOLUTION_SVG_OPEN = '<svg class="grid-svg solution-grid-svg" '
+_SVG_MOVE = 'M%d %d'
+_SVG_LABEL = '<text x="%d" y="%d">%s</text>'
+_SVG_VALUE = '<text class="v" x="%d" y="%d">%s</text>'
+
+# Cell markup by layout value; numbered walls not listed here are added on first use
+_CELL_HTML = {
+    0: '    <div class="cell empty"></div>\n',
+    'X': '    <div class="cell wall"></div>\n',
+}
+_CELL_HTML.update((n, _NUMBER_CELL_HTML % (n, n)) for n in range(1, 5))
+
+@lru_cache(maxsize=None)
+def _grid_header_html(size: int) -> str:
+    """Column headers (A, B, C, ...) shared by every grid of this size"""
+    header = '  <div class="grid-header">\n'
+    header += '    <div class="corner-cell"></div>\n'
+    for letter in _COL_LETTERS[:size]:
+        header += _HEADER_CELL_HTML % letter
+    header += '  </div>\n'
+    return header
+
+@lru_cache(maxsize=None)
+def _grid_row_openings(size: int) -> tuple:
+    """Row openings with their row numbers, shared by every grid of this size"""
+    return tuple(_ROW_OPEN_HTML % (i + 1) for i in range(size))
+
+def render_grid_body(layout: List[List], size: int) -> str:
+    """Render a complete puzzle grid"""
+    # Add column headers (A, B, C, ...)
+    html = _PUZZLE_GRID_OPEN + _grid_header_html(size)
+    
+    # Add rows with row numbers
+    row_openings = _grid_row_openings(len(layout))
+    cell_html = _CELL_HTML
+    for i, row in enumerate(layout):
+        html += row_openings[i]
+        for cell in row:
+            html += cell_html.get(cell) or cell_html.setdefault(cell, _NUMBER_CELL_HTML % (cell, cell))
+        html += '  </div>\n'
+    
+    html += '</div>'
+    return html
+
+def render_grid_svg_body(layout: List[List], size: int, solution: bool = False) -> str:
+    """Render a complete SVG grid, one path per cell kind"""
+    step = _SVG_CELL
+    half = step // 2
+    extent = (size + 1) * step
+    square = f'h{step - 1}v{step - 1}h-{step - 1}z'
+    
+    headers = []
+    labels = []
+    for k in range(size):
+        offset = (k + 1) * step
+        headers.append(_SVG_MOVE % (offset + 1, 1) + square + _SVG_MOVE % (1, offset + 1) + square)
+        labels.append(_SVG_LABEL % (offset + half, half, _COL_LETTERS[k]))
+        labels.append(_SVG_LABEL % (half, offset + half, k + 1))
+    
+    empty, walls, numbered = [], [], []
+    for i, row in enumerate(layout):
+        y = (i + 1) * step + 1
+        for j, cell in enumerate(row):
+            x = (j + 1) * step + 1
+            if cell == 0:
+                empty.append(_SVG_MOVE % (x, y) + square)
+            elif cell == 'X':
+                walls.append(_SVG_MOVE % (x, y) + square)
+            else:
+                numbered.append(_SVG_MOVE % (x, y) + square)
+                labels.append(_SVG_VALUE % (x - 1 + half, y - 1 + half, cell))
+    
+    empty_class = 'sl' if solution else 'em'
+    return (
+        (_SOLUTION_SVG_OPEN if solution else _PUZZLE_SVG_OPEN) +
+        f'viewBox="0 0 {extent} {extent}" width="{extent}" height="{extent}" role="img">\n'
+        f'  <rect class="gl" width="{extent}" height="{extent}" rx="8"/>\n'
+        f'  <path class="cn" d="M1 1{square}"/>\n'
+        f'  <path class="hd" d="{"".join(headers)}"/>\n'
+        f'  <path class="{empty_class}" d="{"".join(empty)}"/>\n'
+        f'  <path class="wl" d="{"".join(walls)}"/>\n'
+        f'  <path class="nm" d="{"".join(numbered)}"/>\n'
+        f'  {"".join(labels)}\n'
+        '</svg>'
+    )
+
+# Page templates, parsed once at import and filled with str.format per ebook
+_EBOOK_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <meta name="description" content="Beautiful Akari logic puzzles with zen-like Japanese aesthetic">
+    <link rel="stylesheet" href="{css_href}">
+    <link rel="stylesheet" href="{print_css_href}" media="print">
+    <link rel="stylesheet" href="{responsive_css_href}" media="(max-width: 768px)">
+    <link rel="stylesheet" href="{dark_css_href}" media="(prefers-color-scheme: dark)">
+</head>
+<body>
+    <header>
+        <h1>{title}</h1>
+        <div class="zen-quote">
+            "In the art of illumination, find the perfect balance of light and shadow"
+        </div>
+        <p style="text-align: center; color: var(--text-muted);">
+            Generated with care on {generated_on}
+        </p>
+    </header>
+    
+    <div class="zen-divider"></div>
+    
+    <section class="rules-section">
+        <h2>How to Play Akari (Light Up)</h2>
+        <p><strong>The Art of Illumination:</strong></p>
+        <ul class="rules-list">
+            <li>Place light bulbs in white cells to illuminate the entire board</li>
+            <li>Light travels in straight lines until blocked by walls</li>
+            <li>No two bulbs may shine on each other</li>
+            <li>Numbered walls must have exactly that many adjacent bulbs</li>
+            <li>Every white cell must be lit or contain a bulb</li>
+            <li>Find the perfect balance of light and shadow</li>
+        </ul>
+    </section>
+    
+    <div class="zen-divider"></div>
+    
+    <section class="toc">
+        <h2>Contents</h2>
+        <div class="toc-list">
+"""
+
+_TOC_ITEM = """
+            <div class="toc-item">
+                <span class="toc-number">{num}.</span>
+                <span class="toc-title">{size}×{size} {difficulty} Puzzle</span>
+                <span class="toc-difficulty">{difficulty}</span>
+            </div>
+"""
+
+_PUZZLES_OPEN = """
+        </div>
+    </section>
+    
+    <div class="zen-divider"></div>
+    
+    <section class="puzzle-section">
+        <h2>Puzzles</h2>
+"""
+
+_PUZZLE_BLOCK = """
+        <div class="puzzle-container">
+            <div class="puzzle-header">
+                <h3>Puzzle {num}: {size}×{size} {difficulty}</h3>
+            </div>
+            
+            <div style="--size: {size};">
+                {grid}
+            </div>
+            
+            <div style="text-align: center; margin: 1rem 0;">
+                <strong>Your Solution:</strong>
+            </div>
+            
+            <div style="--size: {size};">
+                {solution_grid}
+            </div>
+        </div>
+        
+        <div class="page-break"></div>
+"""
+
+_SECTION_CLOSE = """
+    </section>
+"""
+
+_SOLUTIONS_OPEN = """    
+    <div class="zen-divider"></div>
+    
+    <section class="puzzle-section">
+        <h2>Solutions</h2>
+"""
+
+_SOLUTION_BLOCK = """
+        <div class="puzzle-container">
+            <div class="puzzle-header">
+                <h3>Solution {num}: {size}×{size} {difficulty}</h3>
+            </div>
+            
+            <div style="--size: {size};">
+                {grid}
+            </div>
+        </div>
+        
+        <div class="page-break"></div>
+"""
+
+# Static tail, written verbatim (never formatted, the script braces stay literal)
+_EBOOK_FOOT = """    
+    <footer style="text-align: center; margin-top: 3rem; padding-top: 2rem; border-top: 1px solid var(--grid-line); color: var(--text-muted);">
+        <p>Thank you for practicing the art of Akari</p>
+        <p>Generated by ShrinePuzzle.com</p>
+    </footer>
+    
+    <script>
+        // Add print functionality
+        function printEbook() {
+            window.print();
+        }
+        
+        // Add keyboard shortcut for printing
+        document.addEventListener('keydown', function(e) {
+            if (e.ctrlKey && e.key === 'p') {
+                e.preventDefault();
+                printEbook();
+            }
+        });
+        
+        // Auto-adjust grid sizes based on puzzle size
+        document.addEventListener('DOMContentLoaded', function() {
+            const grids = document.querySelectorAll('.puzzle-grid, .solution-grid');
+            grids.forEach(grid => {
+                const size = grid.querySelectorAll('.grid-row').length;
+                if (size > 8) {
+                    grid.style.setProperty('--cell-size', '2rem');
+                } else if (size > 6) {
+                    grid.style.setProperty('--cell-size', '2.2rem');
+                } else {
+                    grid.style.setProperty('--cell-size', '2.5rem');
+                }
+            });
+        });
+    </script>
+</body>
+</html>
+"""
+
+# Print-only rules, linked with media="print" so screens never parse them
+_PRINT_CSS = """
+/* Print Styles */
+/* Paged media: page size, running title and page numbers (WeasyPrint, Paged.js, browser print) */
+@page {
+    size: A4;
+    margin: 15mm;
+    
+    @top-center {
+        content: string(ebook-title);
+        font-size: 9pt;
+        color: #666;
+    }
+    
+    @bottom-right {
+        content: counter(page);
+        font-size: 9pt;
+        color: #666;
+    }
+}
+
+@page :first {
+    @top-center {
+        content: none;
+    }
+    
+    @bottom-right {
+        content: none;
+    }
+}
+
+body {
+    background: white;
+    color: black;
+    font-size: 12pt;
+    line-height: 1.4;
+    padding: 0;
+    margin: 0;
+}
+
+h1 {
+    font-size: 24pt;
+    color: black;
+    margin-bottom: 0.5rem;
+    string-set: ebook-title content();
+}
+
+h2 {
+    font-size: 18pt;
+    color: black;
+    margin: 1rem 0 0.5rem;
+    border-bottom: 1px solid #ccc;
+}
+
+h3 {
+    font-size: 14pt;
+    color: black;
+    margin: 1rem 0 0.3rem;
+}
+
+.puzzle-grid, .solution-grid, .grid-svg {
+    page-break-inside: avoid;
+    margin: 1rem auto;
+}
+
+.puzzle-container {
+    page-break-inside: avoid;
+    margin: 1rem 0;
+}
+
+.zen-divider {
+    display: none;
+}
+
+.zen-quote {
+    background: none;
+    border-left: 2px solid #ccc;
+    color: #666;
+}
+
+.rules-section, .toc {
+    background: white;
+    border: 1px solid #ccc;
+    padding: 1rem;
+}
+
+.corner-cell, .header-cell, .row-header {
+    background: #333 !important;
+    color: white !important;
+}
+
+.cell.wall {
+    background: #333 !important;
+    color: white !important;
+}
+
+.cell.wall.number {
+    background: #b31b1b !important;
+    color: white !important;
+}
+
+.cell.empty {
+    background: white !important;
+    border: 1px solid #ccc !important;
+}
+
+.solution-cell {
+    border: 2px dashed #ccc !important;
+    background: white !important;
+}
+
+.grid-svg .cn, .grid-svg .hd, .grid-svg .wl { fill: #333; }
+.grid-svg .nm { fill: #b31b1b; }
+.grid-svg .em, .grid-svg .sl { fill: white; }
+.grid-svg .sl { stroke: #ccc; }
+.grid-svg text { fill: white; }
+
+/* Hide non-essential elements */
+.no-print {
+    display: none !important;
+}
+
+/* Page breaks */
+.page-break {
+    page-break-before: always;
+}
+
+/* Ensure puzzles don't break across pages */
+.puzzle-section {
+    page-break-inside: avoid;
+}
+"""
+
+# Small-screen rules, linked with a max-width media query after the print sheet
+_RESPONSIVE_CSS = """
+/* Responsive Design */
+body {
+    padding: 1rem;
+}
+
+.puzzle-grid, .solution-grid {
+    grid-template-columns: auto repeat(var(--size, 6), 1fr);
+}
+
+.corner-cell, .header-cell, .row-header, .cell {
+    padding: 0.5rem;
+    min-width: 2rem;
+    min-height: 2rem;
+    font-size: 0.8rem;
+}
+"""
+
+# Dark mode rules, linked with a prefers-color-scheme media query
+_DARK_CSS = """
+/* Dark mode support */
+:root {
+    --bg: #1c1c1c;
+    --text: #f0f0f0;
+    --text-muted: #aaa;
+    --cell-bg: #2a2a2a;
+    --white: #2a2a2a;
+}
+
+body {
+    background: var(--bg);
+    color: var(--text);
+}
+
+.rules-section, .toc {
+    background: rgba(255, 255, 255, 0.05);
+    border-color: rgba(255, 255, 255, 0.1);
+}
+"""
 
 class HTMLEbookGenerator:
     def __init__(self, config: Dict):
@@ -36,57 +498,81 @@ class HTMLEbookGenerator:
             'bg': '#f9f6f0',           # Warm off-white background
         }
         
-    def create_puzzle_grid_html(self, layout: List[List], size: int, puzzle_num: int) -> str:
-        """Convert puzzle layout to HTML grid with zen styling"""
-        html = f'<div class="puzzle-grid puzzle-{puzzle_num}">\n'
+        # Rendered grids: empty solution grids per size, puzzle grids per layout
+        self._solution_grid_cache: Dict[int, str] = {}
+        self._grid_html_cache: Dict[tuple, str] = {}
         
-        # Add column headers (A, B, C, ...)
-        html += '  <div class="grid-header">\n'
-        html += '    <div class="corner-cell"></div>\n'
-        for i in range(size):
-            html += f'    <div class="header-cell">{chr(65 + i)}</div>\n'
-        html += '  </div>\n'
+        # The palette never changes after construction, so format the screen CSS once
+        self._css_cached = self._build_css()
         
-        # Add rows with row numbers
-        for i, row in enumerate(layout):
-            html += f'  <div class="grid-row">\n'
-            html += f'    <div class="row-header">{i + 1}</div>\n'
-            for j, cell in enumerate(row):
-                if cell == 0:
-                    html += '    <div class="cell empty"></div>\n'
-                elif cell == 'X':
-                    html += '    <div class="cell wall"></div>\n'
-                else:
-                    html += f'    <div class="cell wall number" data-value="{cell}">{cell}</div>\n'
-            html += '  </div>\n'
+    def create_puzzle_grid_html(self, layout: List[List], size: int, puzzle_num: int) -> str:
+        """Convert puzzle layout to HTML grid with zen styling"""
+        # Grids carry no per-puzzle markup, so puzzles and solutions (and duplicate
+        # layouts) share one rendered string; puzzle_num is kept for callers
+        key = (size, tuple(map(tuple, layout)))
+        body = self._grid_html_cache.get(key)
+        if body is None:
+            body = render_grid_body(layout, size)
+            self._grid_html_cache[key] = body
         
-        html += '</div>'
-        return html
+        return body
     
     def create_solution_grid_html(self, layout: List[List], size: int, puzzle_num: int) -> str:
         """Create a solution grid (empty for user to fill)"""
-        html = f'<div class="solution-grid puzzle-{puzzle_num}">\n'
+        # The empty grid only depends on size
+        body = self._solution_grid_cache.get(size)
+        if body is None:
+            # Add column headers
+            body = _SOLUTION_GRID_OPEN + _grid_header_html(size)
+            
+            # Add empty rows
+            empty_cells = '    <div class="cell empty solution-cell"></div>\n' * size
+            for row_opening in _grid_row_openings(size):
+                body += row_opening + empty_cells + '  </div>\n'
+            
+            body += '</div>'
+            self._solution_grid_cache[size] = body
         
-        # Add column headers
-        html += '  <div class="grid-header">\n'
-        html += '    <div class="corner-cell"></div>\n'
-        for i in range(size):
-            html += f'    <div class="header-cell">{chr(65 + i)}</div>\n'
-        html += '  </div>\n'
+        return body
+    
+    def create_puzzle_grid_svg(self, layout: List[List], size: int, puzzle_num: int) -> str:
+        """Render the puzzle grid as a single SVG instead of one div per cell"""
+        key = ('svg', size, tuple(map(tuple, layout)))
+        body = self._grid_html_cache.get(key)
+        if body is None:
+            body = render_grid_svg_body(layout, size)
+            self._grid_html_cache[key] = body
         
-        # Add empty rows
-        for i in range(size):
-            html += f'  <div class="grid-row">\n'
-            html += f'    <div class="row-header">{i + 1}</div>\n'
-            for j in range(size):
-                html += '    <div class="cell empty solution-cell"></div>\n'
-            html += '  </div>\n'
+        return body
+    
+    def create_solution_grid_svg(self, layout: List[List], size: int, puzzle_num: int) -> str:
+        """Render the empty solution grid as a single SVG"""
+        key = ('svg', size)
+        body = self._solution_grid_cache.get(key)
+        if body is None:
+            body = render_grid_svg_body([[0] * size for _ in range(size)], size, solution=True)
+            self._solution_grid_cache[key] = body
         
-        html += '</div>'
-        return html
+        return body
     
     def generate_css(self) -> str:
-        """Generate zen-like CSS with print styling"""
+        """Generate zen-like screen CSS"""
+        return self._css_cached
+    
+    def generate_print_css(self) -> str:
+        """Generate the print stylesheet"""
+        return _PRINT_CSS
+    
+    def generate_responsive_css(self) -> str:
+        """Generate the small-screen stylesheet"""
+        return _RESPONSIVE_CSS
+    
+    def generate_dark_css(self) -> str:
+        """Generate the dark mode stylesheet"""
+        return _DARK_CSS
+    
+    def _build_css(self) -> str:
+        """Format the zen-like screen CSS template with the color palette"""
         return f"""
 /* Zen-like Akari Puzzle Ebook Styles */
 @import url('https://fonts.googleapis.com/css2?family=Noto+Serif+JP:wght@400;700&family=Inter:wght@300;400;500;600&display=swap');
@@ -247,6 +733,33 @@ p {{
     background: var(--white);
 }}
 
+.grid-svg {{
+    display: block;
+    margin: 1rem auto;
+    max-width: 100%;
+    height: auto;
+}}
+
+.grid-svg .gl {{ fill: var(--grid-line); }}
+.grid-svg .cn, .grid-svg .nm {{ fill: var(--primary); }}
+.grid-svg .hd {{ fill: var(--secondary); }}
+.grid-svg .em {{ fill: var(--white); }}
+.grid-svg .sl {{ fill: var(--white); stroke: var(--grid-line); stroke-dasharray: 4 3; }}
+.grid-svg .wl {{ fill: var(--wall); }}
+
+.grid-svg text {{
+    fill: var(--white);
+    font-family: 'Inter', sans-serif;
+    font-size: 16px;
+    font-weight: 600;
+    text-anchor: middle;
+    dominant-baseline: central;
+}}
+
+.grid-svg text.v {{
+    font-weight: 700;
+}}
+
 /* Rules Section */
 .rules-section {{
     background: rgba(255, 255, 255, 0.8);
@@ -311,318 +824,150 @@ p {{
     color: var(--text-muted);
     font-size: 0.9rem;
 }}
-
-/* Print Styles */
-@media print {{
-    body {{
-        background: white;
-        color: black;
-        font-size: 12pt;
-        line-height: 1.4;
-        padding: 0;
-        margin: 0;
-    }}
-    
-    h1 {{
-        font-size: 24pt;
-        color: black;
-        margin-bottom: 0.5rem;
-    }}
-    
-    h2 {{
-        font-size: 18pt;
-        color: black;
-        margin: 1rem 0 0.5rem;
-        border-bottom: 1px solid #ccc;
-    }}
-    
-    h3 {{
-        font-size: 14pt;
-        color: black;
-        margin: 1rem 0 0.3rem;
-    }}
-    
-    .puzzle-grid, .solution-grid {{
-        page-break-inside: avoid;
-        margin: 1rem auto;
-    }}
-    
-    .puzzle-container {{
-        page-break-inside: avoid;
-        margin: 1rem 0;
-    }}
-    
-    .zen-divider {{
-        display: none;
-    }}
-    
-    .zen-quote {{
-        background: none;
-        border-left: 2px solid #ccc;
-        color: #666;
-    }}
-    
-    .rules-section, .toc {{
-        background: white;
-        border: 1px solid #ccc;
-        padding: 1rem;
-    }}
-    
-    .corner-cell, .header-cell, .row-header {{
-        background: #333 !important;
-        color: white !important;
-    }}
-    
-    .cell.wall {{
-        background: #333 !important;
-        color: white !important;
-    }}
-    
-    .cell.wall.number {{
-        background: #b31b1b !important;
-        color: white !important;
-    }}
-    
-    .cell.empty {{
-        background: white !important;
-        border: 1px solid #ccc !important;
-    }}
-    
-    .solution-cell {{
-        border: 2px dashed #ccc !important;
-        background: white !important;
-    }}
-    
-    /* Hide non-essential elements */
-    .no-print {{
-        display: none !important;
-    }}
-    
-    /* Page breaks */
-    .page-break {{
-        page-break-before: always;
-    }}
-    
-    /* Ensure puzzles don't break across pages */
-    .puzzle-section {{
-        page-break-inside: avoid;
-    }}
-}}
-
-/* Responsive Design */
-@media (max-width: 768px) {{
-    body {{
-        padding: 1rem;
-    }}
-    
-    .puzzle-grid, .solution-grid {{
-        grid-template-columns: auto repeat(var(--size, 6), 1fr);
-    }}
-    
-    .corner-cell, .header-cell, .row-header, .cell {{
-        padding: 0.5rem;
-        min-width: 2rem;
-        min-height: 2rem;
-        font-size: 0.8rem;
-    }}
-}}
-
-/* Dark mode support */
-@media (prefers-color-scheme: dark) {{
-    :root {{
-        --bg: #1c1c1c;
-        --text: #f0f0f0;
-        --text-muted: #aaa;
-        --cell-bg: #2a2a2a;
-        --white: #2a2a2a;
-    }}
-    
-    body {{
-        background: var(--bg);
-        color: var(--text);
-    }}
-    
-    .rules-section, .toc {{
-        background: rgba(255, 255, 255, 0.05);
-        border-color: rgba(255, 255, 255, 0.1);
-    }}
-}}
 """
-
-    def generate_ebook(self, puzzles: List[Dict], output_file: str, title: str = "Akari: Zen Logic Puzzles"):
-        """Generate a beautiful HTML ebook with zen-like Japanese aesthetic"""
-        
-        # Generate CSS
-        css = self.generate_css()
-        
-        # Start HTML
-        html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <meta name="description" content="Beautiful Akari logic puzzles with zen-like Japanese aesthetic">
-    <style>
-{css}
-    </style>
-</head>
-<body>
-    <header>
-        <h1>{title}</h1>
-        <div class="zen-quote">
-            "In the art of illumination, find the perfect balance of light and shadow"
-        </div>
-        <p style="text-align: center; color: var(--text-muted);">
-            Generated with care on {datetime.now().strftime('%B %d, %Y')}
-        </p>
-    </header>
     
-    <div class="zen-divider"></div>
+    def stylesheets(self) -> Dict[str, str]:
+        """Stylesheet contents by filename"""
+        return {
+            CSS_FILENAME: self.generate_css(),
+            PRINT_CSS_FILENAME: self.generate_print_css(),
+            RESPONSIVE_CSS_FILENAME: self.generate_responsive_css(),
+            DARK_CSS_FILENAME: self.generate_dark_css(),
+        }
     
-    <section class="rules-section">
-        <h2>How to Play Akari (Light Up)</h2>
-        <p><strong>The Art of Illumination:</strong></p>
-        <ul class="rules-list">
-            <li>Place light bulbs in white cells to illuminate the entire board</li>
-            <li>Light travels in straight lines until blocked by walls</li>
-            <li>No two bulbs may shine on each other</li>
-            <li>Numbered walls must have exactly that many adjacent bulbs</li>
-            <li>Every white cell must be lit or contain a bulb</li>
-            <li>Find the perfect balance of light and shadow</li>
-        </ul>
-    </section>
+    def write_stylesheets(self, directory: Path, minify: bool = True) -> List[Path]:
+        """Write the shared stylesheets into directory, skipping files that are unchanged"""
+        paths = []
+        for filename, css in self.stylesheets().items():
+            css_path = directory / filename
+            if minify:
+                css = _minify_css(css)
+            
+            try:
+                unchanged = css_path.read_text(encoding='utf-8') == css
+            except FileNotFoundError:
+                unchanged = False
+            
+            if not unchanged:
+                css_path.write_text(css, encoding='utf-8')
+            paths.append(css_path)
+        return paths
     
-    <div class="zen-divider"></div>
+    def ebook_cache_key(self, puzzles: List[Dict], title: str, minify: bool = True,
+                        include_solutions: bool = True, svg_grids: bool = False) -> str:
+        """Content hash of everything that ends up in the ebook"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(puzzles, sort_keys=True).encode('utf-8'))
+        digest.update(title.encode('utf-8'))
+        for css in self.stylesheets().values():
+            digest.update(css.encode('utf-8'))
+        digest.update(b'minified' if minify else b'plain')
+        digest.update(b'solutions' if include_solutions else b'puzzles-only')
+        digest.update(b'svg' if svg_grids else b'div')
+        return digest.hexdigest()
     
-    <section class="toc">
-        <h2>Contents</h2>
-        <div class="toc-list">
-"""
+    def generate_ebook(self, puzzles: List[Dict], output_file: str, title: str = "Akari: Zen Logic Puzzles",
+                       minify: bool = True, include_solutions: bool = True, svg_grids: bool = False):
+        """Generate a beautiful HTML ebook with zen-like Japanese aesthetic"""
         
-        # Table of contents
-        for i, puzzle in enumerate(puzzles, 1):
-            html += f"""
-            <div class="toc-item">
-                <span class="toc-number">{i}.</span>
-                <span class="toc-title">{puzzle['size']}×{puzzle['size']} {puzzle['difficulty'].title()} Puzzle</span>
-                <span class="toc-difficulty">{puzzle['difficulty'].title()}</span>
-            </div>
-"""
+        # Write CSS next to the ebook so browsers can cache it across ebooks
+        css_paths = self.write_stylesheets(Path(output_file).parent, minify)
         
-        html += """
-        </div>
-    </section>
-    
-    <div class="zen-divider"></div>
-    
-    <section class="puzzle-section">
-        <h2>Puzzles</h2>
-"""
+        # Same puzzles, title and styling as the existing file: nothing to do
+        key = self.ebook_cache_key(puzzles, title, minify, include_solutions, svg_grids)
+        hash_file = f"{output_file}.hash"
+        if os.path.exists(output_file):
+            try:
+                with open(hash_file, 'r', encoding='utf-8') as f:
+                    if f.read().strip() == key:
+                        print(f"♻️  Ebook unchanged, keeping: {output_file}")
+                        return
+            except FileNotFoundError:
+                pass
+        
+        # Layouts are only shared within one ebook, don't keep them across calls
+        self._grid_html_cache.clear()
+        if svg_grids:
+            puzzle_grid, solution_grid = self.create_puzzle_grid_svg, self.create_solution_grid_svg
+        else:
+            puzzle_grid, solution_grid = self.create_puzzle_grid_html, self.create_solution_grid_html
         
-        # Puzzles section
-        for i, puzzle in enumerate(puzzles, 1):
-            size = puzzle['size']
-            layout = puzzle['layout']
+        # Stream each fragment straight to the file instead of growing one big string;
+        # fragments always end between tags, so minifying them one by one is safe
+        with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            if minify:
+                write = lambda fragment: f.write(_minify_html(fragment))
+            else:
+                write = f.write
             
-            html += f"""
-        <div class="puzzle-container">
-            <div class="puzzle-header">
-                <h3>Puzzle {i}: {size}×{size} {puzzle['difficulty'].title()}</h3>
-            </div>
+            # Start HTML (the title is user input, escape it once for both uses)
+            generated_on = datetime.now().strftime('%B %d, %Y')
+            write(_EBOOK_HEAD.format(
+                title=escape(title),
+                css_href=CSS_FILENAME,
+                print_css_href=PRINT_CSS_FILENAME,
+                responsive_css_href=RESPONSIVE_CSS_FILENAME,
+                dark_css_href=DARK_CSS_FILENAME,
+                generated_on=generated_on,
+            ))
             
-            <div style="--size: {size};">
-                {self.create_puzzle_grid_html(layout, size, i)}
-            </div>
+            # Per-puzzle fields used by all three sections, looked up once
+            precomp = [(p['size'], p['layout'], p['difficulty'].title()) for p in puzzles]
             
-            <div style="text-align: center; margin: 1rem 0;">
-                <strong>Your Solution:</strong>
-            </div>
+            # Table of contents
+            for i, (size, layout, difficulty) in enumerate(precomp, 1):
+                write(_TOC_ITEM.format(num=i, size=size, difficulty=difficulty))
             
-            <div style="--size: {size};">
-                {self.create_solution_grid_html(layout, size, i)}
-            </div>
-        </div>
-        
-        <div class="page-break"></div>
-"""
-        
-        html += """
-    </section>
-    
-    <div class="zen-divider"></div>
-    
-    <section class="puzzle-section">
-        <h2>Solutions</h2>
-"""
-        
-        # Solutions section
-        for i, puzzle in enumerate(puzzles, 1):
-            size = puzzle['size']
-            layout = puzzle['layout']
+            write(_PUZZLES_OPEN)
             
-            html += f"""
-        <div class="puzzle-container">
-            <div class="puzzle-header">
-                <h3>Solution {i}: {size}×{size} {puzzle['difficulty'].title()}</h3>
-            </div>
+            # Puzzles section
+            for i, (size, layout, difficulty) in enumerate(precomp, 1):
+                write(_PUZZLE_BLOCK.format(
+                    num=i,
+                    size=size,
+                    difficulty=difficulty,
+                    grid=puzzle_grid(layout, size, i),
+                    solution_grid=solution_grid(layout, size, i),
+                ))
             
-            <div style="--size: {size};">
-                {self.create_puzzle_grid_html(layout, size, f"solution-{i}")}
-            </div>
-        </div>
-        
-        <div class="page-break"></div>
-"""
-        
-        html += """
-    </section>
-    
-    <footer style="text-align: center; margin-top: 3rem; padding-top: 2rem; border-top: 1px solid var(--grid-line); color: var(--text-muted);">
-        <p>Thank you for practicing the art of Akari</p>
-        <p>Generated by ShrinePuzzle.com</p>
-    </footer>
-    
-    <script>
-        // Add print functionality
-        function printEbook() {
-            window.print();
-        }
-        
-        // Add keyboard shortcut for printing
-        document.addEventListener('keydown', function(e) {
-            if (e.ctrlKey && e.key === 'p') {
-                e.preventDefault();
-                printEbook();
-            }
-        });
-        
-        // Auto-adjust grid sizes based on puzzle size
-        document.addEventListener('DOMContentLoaded', function() {
-            const grids = document.querySelectorAll('.puzzle-grid, .solution-grid');
-            grids.forEach(grid => {
-                const size = grid.querySelectorAll('.grid-row').length;
-                if (size > 8) {
-                    grid.style.setProperty('--cell-size', '2rem');
-                } else if (size > 6) {
-                    grid.style.setProperty('--cell-size', '2.2rem');
-                } else {
-                    grid.style.setProperty('--cell-size', '2.5rem');
-                }
-            });
-        });
-    </script>
-</body>
-</html>
-"""
+            write(_SECTION_CLOSE)
+            
+            # Solutions section
+            if include_solutions:
+                write(_SOLUTIONS_OPEN)
+                for i, (size, layout, difficulty) in enumerate(precomp, 1):
+                    write(_SOLUTION_BLOCK.format(
+                        num=i,
+                        size=size,
+                        difficulty=difficulty,
+                        grid=puzzle_grid(layout, size, f"solution-{i}"),
+                    ))
+                write(_SECTION_CLOSE)
+            
+            write(_EBOOK_FOOT)
         
-        # Write to file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        with open(hash_file, 'w', encoding='utf-8') as f:
+            f.write(key)
         
         print(f"✨ Beautiful zen HTML ebook generated: {output_file}")
+        print(f"🎨 Stylesheets: {', '.join(str(path) for path in css_paths)}")
         print(f"📄 Open in browser and press Ctrl+P to print as PDF")
 
+    def export_pdf(self, html_file: str, pdf_file: Optional[str] = None) -> Optional[str]:
+        """Render the ebook (with its print stylesheet) straight to PDF using WeasyPrint"""
+        try:
+            from weasyprint import HTML
+        except ImportError:
+            print("❌ WeasyPrint is not installed (pip install weasyprint); open the HTML and print to PDF instead")
+            return None
+        
+        if pdf_file is None:
+            pdf_file = str(Path(html_file).with_suffix('.pdf'))
+        
+        HTML(filename=html_file).write_pdf(pdf_file)
+        print(f"📄 PDF ebook written: {pdf_file}")
+        return pdf_file
+
 def main():
     parser = argparse.ArgumentParser(description='Generate beautiful Akari puzzle HTML ebooks')
     parser.add_argument('--sizes', nargs='+', type=int, default=[6, 8, 10, 12],
@@ -631,10 +976,20 @@ def main():
                        help='Difficulties to include')
     parser.add_argument('--count', type=int, default=10,
                        help='Puzzles per size/difficulty combination')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Processes to generate puzzle sizes in (one size per process)')
     parser.add_argument('--output', type=str, default='akari_zen_ebook.html',
                        help='Output HTML filename')
     parser.add_argument('--title', type=str, default='Akari: Zen Logic Puzzles',
                        help='Ebook title')
+    parser.add_argument('--no-minify', action='store_true',
+                       help='Keep indentation and comments in the HTML/CSS output')
+    parser.add_argument('--no-solutions', action='store_true',
+                       help='Leave out the Solutions section')
+    parser.add_argument('--svg', action='store_true',
+                       help='Draw each grid as one SVG instead of a div per cell')
+    parser.add_argument('--pdf', action='store_true',
+                       help='Also render a PDF next to the HTML (requires weasyprint)')
     
     args = parser.parse_args()
     
@@ -648,15 +1003,27 @@ def main():
     
     # Generate puzzles for ebook
     print(f"🎯 Generating {args.count} puzzles per size/difficulty combination...")
-    puzzles = generator.puzzle_generator.generate_ebook_puzzles(args.sizes, args.count)
-    
-    # Filter by difficulties
-    puzzles = [p for p in puzzles if p['difficulty'] in args.difficulties]
+    if args.jobs > 1:
+        # Generation is CPU-bound pure Python: spread the sizes over processes
+        # (set before the pool starts on first use)
+        puzzle_pool.PUZZLE_PROCESSES = args.jobs
+        puzzles = puzzle_pool.generate_ebook_puzzles(
+            generator.puzzle_generator, args.sizes, args.count, difficulties=args.difficulties
+        )
+    else:
+        puzzles = generator.puzzle_generator.generate_ebook_puzzles(
+            args.sizes, args.count, difficulties=args.difficulties
+        )
     
     print(f"✨ Generated {len(puzzles)} puzzles for zen HTML ebook")
     
     # Generate beautiful HTML
-    generator.generate_ebook(puzzles, args.output, args.title)
+    generator.generate_ebook(puzzles, args.output, args.title,
+                             minify=not args.no_minify, include_solutions=not args.no_solutions,
+                             svg_grids=args.svg)
+    
+    if args.pdf:
+        generator.export_pdf(args.output)
     
     print(f"🎨 Beautiful zen HTML ebook created with {len(puzzles)} puzzles")
     print(f"🌐 Open {args.output} in your browser to view")
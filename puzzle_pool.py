@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Process pool for CPU-bound puzzle generation
+Shared by the API servers and the polling client. Workers are started by
+forkserver (spawn where that isn't available), never forked from a parent
+that is already running threads, and log through the parent's handlers.
+Each worker still imports the calling script as __mp_main__, so scripts that
+use the pool keep their module-level setup behind a __name__ check.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+def _cpu_limit() -> int:
+    """CPUs this process can actually use: its affinity, capped by a cgroup v2
+    CPU quota (systemd's CPUQuota=, e.g. 50% is one CPU's worth at most)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/proc/self/cgroup') as f:
+            path = next(line[3:].strip() for line in f if line.startswith('0::'))
+        with open(f'/sys/fs/cgroup{path}/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, StopIteration, ValueError):
+        pass
+    return cpus
+
+# Puzzle generation is CPU-bound: one process per usable CPU. With a single one
+# there is nothing to overlap, so work stays in the calling process
+PUZZLE_PROCESSES = _cpu_limit()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+class _ParentLogHandler(logging.Handler):
+    """Hands records sent up by the workers to the parent's own loggers"""
+    
+    def emit(self, record):
+        logger = logging.getLogger() if record.name == 'root' else logging.getLogger(record.name)
+        logger.handle(record)
+
+def _init_worker(log_queue):
+    """Worker initializer: send this process's log records to the parent, which owns the log files"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+def get_pool() -> ProcessPoolExecutor:
+    """The process-wide puzzle pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                # The default preload is ['__main__'], which would run the calling
+                # script (and build its API object) once in the server for every
+                # worker to inherit; the workers only need this module
+                context.set_forkserver_preload(['puzzle_pool'])
+            log_queue = context.Queue()
+            listener = logging.handlers.QueueListener(log_queue, _ParentLogHandler())
+            listener.start()
+            atexit.register(listener.stop)
+            _pool = ProcessPoolExecutor(max_workers=PUZZLE_PROCESSES, mp_context=context,
+                                        initializer=_init_worker, initargs=(log_queue,))
+        return _pool
+
+# Per-process generators for the workers, by (api_url, api_key), built on first use
+_generators = {}
+
+def _generator(api_url: str, api_key: str):
+    generator = _generators.get((api_url, api_key))
+    if generator is None:
+        # Imported here, after _init_worker, so its logging setup finds the queue handler
+        from akari_generator_api import AkariPuzzleGeneratorAPI
+        generator = _generators[(api_url, api_key)] = AkariPuzzleGeneratorAPI(api_url, api_key)
+    return generator
+
+def _batch_puzzles(api_url: str, api_key: str, size: int, difficulty: str, count: int) -> List[Optional[Dict]]:
+    """Worker: count puzzles of one size and difficulty (None for each failure)"""
+    generator = _generator(api_url, api_key)
+    puzzles = []
+    for _ in range(count):
+        puzzles.append(generator.generate_puzzle(size, difficulty))
+        # Small delay to prevent overwhelming the system
+        time.sleep(0.1)
+    return puzzles
+
+def _ebook_puzzles(api_url: str, api_key: str, size: int, count: int, difficulties: List[str]) -> List[Dict]:
+    """Worker: ebook puzzles of one size"""
+    return _generator(api_url, api_key).generate_ebook_puzzles([size], count, difficulties=difficulties)
+
+def generate_batch(generator, sizes: List[int], difficulties: List[str],
+                   count_per_size: int = 10, mode: str = 'premium') -> Dict:
+    """generator.generate_batch with each (size, difficulty) generated in its own process"""
+    if PUZZLE_PROCESSES <= 1:
+        return generator.generate_batch(sizes, difficulties, count_per_size, mode)
+    
+    results = {
+        'total_generated': 0,
+        'total_sent': 0,
+        'failed': 0,
+        'by_size': {size: 0 for size in sizes},
+        'by_difficulty': {difficulty: 0 for difficulty in difficulties}
+    }
+    
+    pool = get_pool()
+    tasks = [(size, difficulty) for size in sizes for difficulty in difficulties]
+    for size, difficulty in tasks:
+        logging.info(f"Generating {count_per_size} {difficulty} {size}x{size} puzzles...")
+    futures = [pool.submit(_batch_puzzles, generator.api_url, generator.api_key, size, difficulty, count_per_size)
+               for size, difficulty in tasks]
+    
+    # Collected in submission order, so puzzles are sent in the same order as serially
+    all_puzzles = []
+    for (size, difficulty), future in zip(tasks, futures):
+        for puzzle in future.result():
+            if puzzle:
+                results['total_generated'] += 1
+                results['by_size'][size] += 1
+                results['by_difficulty'][difficulty] += 1
+                all_puzzles.append(puzzle)
+            else:
+                results['failed'] += 1
+    
+    # Send all puzzles to API
+    if all_puzzles:
+        logging.info(f"Sending {len(all_puzzles)} puzzles to API...")
+        api_result = generator.send_puzzles_to_api(all_puzzles, mode)
+        
+        if api_result['success']:
+            api_data = api_result.get('data', {})
+            results['total_sent'] = api_data.get('saved', 0)
+            results['api_errors'] = api_data.get('errors', [])
+            logging.info(f"API Response: {api_result['message']}")
+        else:
+            logging.error(f"API Error: {api_result['error']}")
+            results['api_error'] = api_result['error']
+    
+    return results
+
+def generate_ebook_puzzles(generator, sizes: List[int], count_per_size: int = 20,
+                           difficulties: Optional[List[str]] = None) -> List[Dict]:
+    """generator.generate_ebook_puzzles with each size generated in its own process, in the same order"""
+    if len(sizes) <= 1 or PUZZLE_PROCESSES <= 1:
+        return generator.generate_ebook_puzzles(sizes, count_per_size, difficulties=difficulties)
+    
+    pool = get_pool()
+    futures = [pool.submit(_ebook_puzzles, generator.api_url, generator.api_key, size, count_per_size, difficulties)
+               for size in sizes]
+    return [puzzle for future in futures for puzzle in future.result()]
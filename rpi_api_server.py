@@ -4,60 +4,251 @@ Raspberry Pi API Server for Admin Control
 Handles commands from the admin backend
 """
 
+import io
 import json
 import subprocess
 import os
+import hmac
+import functools
 import sys
 import logging
+import logging.handlers
 import threading
 import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import urllib.parse
 import ssl
 
+# orjson serializes straight to bytes in C; fall back to the stdlib when it isn't installed
+try:
+    import orjson
+    
+    def _json_bytes(data) -> bytes:
+        # Command results can have int keys (generate_batch's by_size); json.dumps
+        # turns them into strings, orjson needs telling to
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    
+    # The config file stays indented: README_API.md and README_COMPLETE.md have it
+    # edited by hand (nano config/generator_config.json), and it's a few hundred bytes
+    def _json_file_bytes(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_bytes(data) -> bytes:
+        return json.dumps(data).encode()
+    
+    def _json_file_bytes(data) -> bytes:
+        return json.dumps(data, indent=2).encode()
+    
+    _json_loads = json.loads
+
 # Import our modules
 from akari_generator_api import AkariPuzzleGeneratorAPI
 from ebook_generator import EbookGenerator
 from cdn_bunny_uploader import CDNBunnyUploader
+import puzzle_pool
+from rpi_sysinfo import (HAVE_PROC, disk_report, memory_report, service_status, tail, tail_bytes,
+                         uptime_report)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('rpi_api_server.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (not in puzzle_pool's workers, which import this script as
+# __mp_main__ and log through the parent)
+if __name__ != '__mp_main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.handlers.RotatingFileHandler('rpi_api_server.log', maxBytes=5_000_000, backupCount=3),
+            logging.StreamHandler()
+        ]
+    )
 
 # Configuration
 API_KEY = 'rpi_control_key_2024'  # Change this!
+EXPECTED_TOKEN = API_KEY.encode()
 PORT = 8080
 HOST = '0.0.0.0'
 
+# Background commands run on a small shared pool; beyond COMMAND_QUEUE_LIMIT
+# queued or running commands, /api/execute answers 429 instead of piling up work
+COMMAND_WORKERS = 4
+COMMAND_QUEUE_LIMIT = 16
+EXECUTOR = ThreadPoolExecutor(max_workers=COMMAND_WORKERS, thread_name_prefix='rpi-cmd')
+_COMMAND_SLOTS = threading.BoundedSemaphore(COMMAND_QUEUE_LIMIT)
+
+# Connections are served by a fixed pool rather than a new thread each. An open
+# connection holds one of the CONNECTION_WORKERS threads, idle keep-alive ones
+# included, until it closes or sends nothing for CONNECTION_IDLE_TIMEOUT
+# seconds; beyond CONNECTION_WORKERS open connections, new ones wait in the
+# listen backlog until a thread frees up. The admin backend polls, so the short
+# timeout costs it at most a reconnect.
+CONNECTION_WORKERS = 32
+CONNECTION_IDLE_TIMEOUT = 5
+
+# Admin commands are tiny JSON documents; anything bigger is refused with 413
+MAX_BODY = 64 * 1024
+
+CONFIG_PATH = 'config/generator_config.json'
+
+# Parsed config, shared by all requests and re-read only when the file's mtime changes
+_CONFIG_LOCK = threading.RLock()
+_CONFIG_CACHE = {'mtime': None, 'data': None}
+
+def _default_config():
+    return {
+        'api_url': 'https://shrinepuzzle.com/api/puzzle_receiver.php',
+        'api_key': 'shrine_puzzle_api_key_2024',
+        'cdn_bunny': {
+            'storage_zone': 'your-storage-zone',
+            'api_key': 'your-cdn-bunny-key',
+            'storage_zone_name': 'your-zone-name',
+            'region': 'de'
+        }
+    }
+
 # Load configuration
 def load_config():
     try:
-        with open('config/generator_config.json', 'r') as f:
-            return json.load(f)
+        mtime = os.stat(CONFIG_PATH).st_mtime
     except FileNotFoundError:
-        return {
-            'api_url': 'https://shrinepuzzle.com/api/puzzle_receiver.php',
-            'api_key': 'shrine_puzzle_api_key_2024',
-            'cdn_bunny': {
-                'storage_zone': 'your-storage-zone',
-                'api_key': 'your-cdn-bunny-key',
-                'storage_zone_name': 'your-zone-name',
-                'region': 'de'
-            }
-        }
+        mtime = None
+    
+    with _CONFIG_LOCK:
+        if _CONFIG_CACHE['data'] is None or _CONFIG_CACHE['mtime'] != mtime:
+            try:
+                with open(CONFIG_PATH, 'r') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = _default_config()
+            _CONFIG_CACHE['data'] = data
+            _CONFIG_CACHE['mtime'] = mtime
+        return _CONFIG_CACHE['data']
+
+def _cache_config(data: Dict):
+    """Store a config that was just written to CONFIG_PATH, so it isn't re-read"""
+    with _CONFIG_LOCK:
+        _CONFIG_CACHE['data'] = data
+        _CONFIG_CACHE['mtime'] = os.stat(CONFIG_PATH).st_mtime
+
+def _write_config(data: Dict):
+    """Atomically replace CONFIG_PATH, so readers never see a half-written file"""
+    tmp_path = f"{CONFIG_PATH}.tmp.{os.getpid()}"
+    with _CONFIG_LOCK:
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(_json_file_bytes(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, CONFIG_PATH)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        _cache_config(data)
+
+# Seconds each status command may take where /proc is unavailable
+STATUS_COMMAND_TIMEOUT = 5
+
+def _count_lines(path: str, block: int = 1 << 20) -> int:
+    """Count lines without decoding or keeping the file in memory"""
+    count = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            count += chunk.count(b'\n')
+    return count
+
+class ResultReporter:
+    """Posts finished command results to the admin backend, batched on one thread.
+    
+    Results queued while a POST is in flight (or within `linger` seconds of the
+    first one) go out together as a JSON array over one kept-alive connection."""
+    
+    def __init__(self, max_batch: int = 32, linger: float = 0.5):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.pending = queue.Queue()
+        self.session = requests.Session()
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def submit(self, url: str, report: Dict):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='rpi-report', daemon=True)
+                self.thread.start()
+        self.pending.put((url, report))
+    
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.pending.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            
+            by_url: Dict[str, List[Dict]] = {}
+            for url, report in batch:
+                by_url.setdefault(url, []).append(report)
+            for url, reports in by_url.items():
+                try:
+                    response = self.session.post(url, data=_json_bytes(reports), timeout=30,
+                                                 headers={'Content-Type': 'application/json'})
+                    if response.status_code >= 400:
+                        logging.error(f"Result report failed: HTTP {response.status_code}")
+                except Exception as e:
+                    logging.error(f"Result report error: {str(e)}")
+
+REPORTER = ResultReporter()
+
+def ttl_cache(seconds: float):
+    """Share a handler method's successful result across requests for `seconds`.
+    
+    Calls that arrive while the result is being computed wait for it instead
+    of starting a duplicate (the lock is held for the whole computation)."""
+    def decorator(method):
+        lock = threading.Lock()
+        cached = {'deadline': 0.0, 'value': None}
+        
+        @functools.wraps(method)
+        def wrapper(self):
+            with lock:
+                if time.monotonic() < cached['deadline']:
+                    return cached['value']
+                value = method(self)
+                if value.get('success'):
+                    cached['value'] = value
+                    cached['deadline'] = time.monotonic() + seconds
+                return value
+        return wrapper
+    return decorator
+
+def requires_auth(handler):
+    """Answer 401 unless the request carries the API key as a Bearer token"""
+    @functools.wraps(handler)
+    def wrapper(self, *args, **kwargs):
+        if not self.validate_auth():
+            self.send_json_response({'success': False, 'error': 'Unauthorized'}, 401)
+            return
+        return handler(self, *args, **kwargs)
+    return wrapper
 
 class RPiAPIHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.config = load_config()
-        super().__init__(*args, **kwargs)
+    # Keep-alive: dashboards polling several endpoints reuse one connection
+    protocol_version = 'HTTP/1.1'
+    timeout = CONNECTION_IDLE_TIMEOUT
+    
+    @property
+    def config(self) -> Dict:
+        return load_config()
     
     def log_message(self, format, *args):
         logging.info(f"{self.client_address[0]} - {format % args}")
@@ -67,6 +258,7 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def do_POST(self):
@@ -76,48 +268,90 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
             self.send_error(404, 'Not Found')
     
     def do_GET(self):
-        if self.path == '/api/status':
+        # Route on the path alone so query strings (e.g. /api/logs?lines=100) still match
+        path = urllib.parse.urlsplit(self.path).path
+        if path == '/api/status':
             self.handle_status()
-        elif self.path == '/api/logs':
+        elif path == '/api/logs':
             self.handle_logs()
-        elif self.path == '/api/stats':
+        elif path == '/api/stats':
             self.handle_stats()
+        elif path.startswith('/api/ebooks/'):
+            self.handle_ebook_download(urllib.parse.unquote(path[len('/api/ebooks/'):]))
         else:
             self.send_error(404, 'Not Found')
     
     def send_json_response(self, data, status_code=200):
+        body = _json_bytes(data)
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status_code >= 400:
+            # A request body may still be unread; don't reuse the connection
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        else:
+            self.send_header('Connection', 'keep-alive')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
     
     def validate_auth(self):
         auth_header = self.headers.get('Authorization', '')
         if not auth_header.startswith('Bearer '):
             return False
-        token = auth_header[7:]
-        return token == API_KEY
+        return hmac.compare_digest(auth_header[7:].encode(), EXPECTED_TOKEN)
     
-    def handle_execute(self):
-        if not self.validate_auth():
-            self.send_json_response({'success': False, 'error': 'Unauthorized'}, 401)
-            return
-        
+    def read_body(self):
+        """Request body in one preallocated buffer, or None after answering 411/413"""
         try:
             content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+        except (TypeError, ValueError):
+            self.send_json_response({'success': False, 'error': 'Content-Length required'}, 411)
+            return None
+        if content_length < 0 or content_length > MAX_BODY:
+            self.send_json_response({'success': False, 'error': 'Request body too large'}, 413)
+            return None
+        
+        body = bytearray(content_length)
+        received = 0
+        with memoryview(body) as view:
+            while received < content_length:
+                count = self.rfile.readinto(view[received:])
+                if not count:
+                    break
+                received += count
+        # Client hung up early; parse what arrived and let the JSON error say so
+        del body[received:]
+        return body
+    
+    @requires_auth
+    def handle_execute(self):
+        try:
+            post_data = self.read_body()
+            if post_data is None:
+                return
+            data = _json_loads(post_data)
             
             command = data.get('command')
             params = data.get('params', {})
             
             logging.info(f"Executing command: {command} with params: {params}")
             
-            # Execute command in background thread
-            thread = threading.Thread(target=self.execute_command, args=(command, params))
-            thread.daemon = True
-            thread.start()
+            # Execute command on the background pool, shedding load when it's full
+            if not _COMMAND_SLOTS.acquire(blocking=False):
+                self.send_json_response({
+                    'success': False,
+                    'error': 'Too many commands in progress, try again later'
+                }, 429)
+                return
+            
+            try:
+                future = EXECUTOR.submit(self.execute_command, command, params)
+            except Exception:
+                _COMMAND_SLOTS.release()
+                raise
+            future.add_done_callback(lambda _: _COMMAND_SLOTS.release())
             
             # Return immediate response
             self.send_json_response({
@@ -133,52 +367,102 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
                 'error': str(e)
             }, 500)
     
+    # Clients shared by all requests (and their pooled HTTP sessions), rebuilt when
+    # the config section they were built from changes
+    _clients: Dict[str, Any] = {}
+    _clients_lock = threading.Lock()
+    
+    def _shared_client(self, name: str, key, factory):
+        with self._clients_lock:
+            cached = self._clients.get(name)
+            if cached is None or cached[0] != key:
+                cached = (key, factory())
+                self._clients[name] = cached
+            return cached[1]
+    
+    def _get_uploader(self) -> CDNBunnyUploader:
+        cdn = self.config['cdn_bunny']
+        return self._shared_client(
+            'uploader',
+            json.dumps(cdn, sort_keys=True),
+            lambda: CDNBunnyUploader(
+                storage_zone=cdn['storage_zone'],
+                password=cdn['api_key'],
+                storage_zone_name=cdn['storage_zone_name'],
+                region=cdn['region']
+            )
+        )
+    
+    def _get_puzzle_generator(self) -> AkariPuzzleGeneratorAPI:
+        config = self.config
+        return self._shared_client(
+            'puzzle_generator',
+            (config['api_url'], config['api_key']),
+            lambda: AkariPuzzleGeneratorAPI(config['api_url'], config['api_key'])
+        )
+    
+    def _get_ebook_generator(self) -> EbookGenerator:
+        config = self.config
+        return self._shared_client(
+            'ebook_generator',
+            json.dumps(config, sort_keys=True),
+            lambda: EbookGenerator(config)
+        )
+    
+    @classmethod
+    def _reset_clients(cls):
+        with cls._clients_lock:
+            cls._clients.clear()
+    
+    # Command name -> handler(self, params), resolved with one dict lookup
+    _DISPATCH = {
+        'generate_puzzles': lambda self, params: self.generate_puzzles(params),
+        'generate_ebook': lambda self, params: self.generate_ebook(params),
+        'get_status': lambda self, params: self.get_status(),
+        'get_logs': lambda self, params: self.get_logs(params),
+        'update_config': lambda self, params: self.update_config(params),
+        'restart_service': lambda self, params: self.restart_service(),
+        'get_ebooks': lambda self, params: self.get_ebooks(),
+        'get_stats': lambda self, params: self.get_stats(),
+        'ping': lambda self, params: {'success': True, 'message': 'pong'},
+    }
+    
     def execute_command(self, command: str, params: Dict):
         """Execute command in background thread"""
         try:
-            result = None
-            
-            if command == 'generate_puzzles':
-                result = self.generate_puzzles(params)
-            elif command == 'generate_ebook':
-                result = self.generate_ebook(params)
-            elif command == 'get_status':
-                result = self.get_status()
-            elif command == 'get_logs':
-                result = self.get_logs(params)
-            elif command == 'update_config':
-                result = self.update_config(params)
-            elif command == 'restart_service':
-                result = self.restart_service()
-            elif command == 'get_ebooks':
-                result = self.get_ebooks()
-            elif command == 'get_stats':
-                result = self.get_stats()
-            elif command == 'ping':
-                result = {'success': True, 'message': 'pong'}
-            else:
+            handler = self._DISPATCH.get(command)
+            if handler is None:
                 result = {'success': False, 'error': f'Unknown command: {command}'}
+            else:
+                result = handler(self, params)
             
             # Log result
             logging.info(f"Command {command} completed: {result}")
             
+            # Report it to the admin backend, if one is configured
+            results_url = self.config.get('results_url')
+            if results_url:
+                REPORTER.submit(results_url, {
+                    'command': command,
+                    'result': result,
+                    'completed_at': datetime.now().isoformat()
+                })
+            
         except Exception as e:
             logging.error(f"Command execution error: {str(e)}")
     
     def generate_puzzles(self, params: Dict) -> Dict:
         """Generate puzzles"""
         try:
-            generator = AkariPuzzleGeneratorAPI(
-                self.config['api_url'],
-                self.config['api_key']
-            )
+            generator = self._get_puzzle_generator()
             
             sizes = params.get('sizes', [6, 8, 10, 12])
             difficulties = params.get('difficulties', ['easy', 'medium', 'hard'])
             count = params.get('count', 10)
             mode = params.get('mode', 'premium')
             
-            result = generator.generate_batch(sizes, difficulties, count, mode)
+            # CPU-bound: generated on the shared process pool, one process per core
+            result = puzzle_pool.generate_batch(generator, sizes, difficulties, count, mode)
             
             return {
                 'success': True,
@@ -197,35 +481,39 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
             difficulties = params.get('difficulties', ['easy', 'medium', 'hard'])
             count = params.get('count', 20)
             title = params.get('title', 'Akari Puzzle Collection')
-            output_file = f"ebooks/akari_ebook_{int(time.time())}.pdf"
-            
-            # Ensure ebooks directory exists
-            os.makedirs('ebooks', exist_ok=True)
+            upload = 'cdn_bunny' in self.config
+            keep_local = params.get('keep_local', False) or not upload
             
             # Generate PDF
-            generator = EbookGenerator(self.config)
-            puzzles = generator.puzzle_generator.generate_ebook_puzzles(sizes, count)
-            puzzles = [p for p in puzzles if p['difficulty'] in difficulties]
+            generator = self._get_ebook_generator()
+            # Only generate the requested difficulties (deduplicated, order kept)
+            puzzles = puzzle_pool.generate_ebook_puzzles(
+                generator.puzzle_generator, sizes, count, difficulties=list(dict.fromkeys(difficulties))
+            )
             
-            generator.generate_ebook(puzzles, output_file, title)
+            if keep_local:
+                # ebooks/ is created once at startup
+                output_file = f"ebooks/akari_ebook_{int(time.time())}.pdf"
+                generator.generate_ebook(puzzles, output_file, title)
+            else:
+                # Upload straight from memory; the SD card never sees the PDF
+                output_file = io.BytesIO()
+                generator.generate_ebook(puzzles, output_file, title)
+                output_file.seek(0)
             
             # Upload to CDN Bunny
-            if 'cdn_bunny' in self.config:
-                uploader = CDNBunnyUploader(
-                    storage_zone=self.config['cdn_bunny']['storage_zone'],
-                    api_key=self.config['cdn_bunny']['api_key'],
-                    storage_zone_name=self.config['cdn_bunny']['storage_zone_name'],
-                    region=self.config['cdn_bunny']['region']
-                )
+            if upload:
+                uploader = self._get_uploader()
                 
                 upload_result = uploader.upload_ebook(output_file, title)
                 
+                data = {'upload_result': upload_result}
+                if keep_local:
+                    data['local_file'] = output_file
+                
                 return {
                     'success': True,
-                    'data': {
-                        'local_file': output_file,
-                        'upload_result': upload_result
-                    },
+                    'data': data,
                     'message': f'Ebook generated and uploaded: {title}'
                 }
             else:
@@ -238,23 +526,27 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @ttl_cache(2)
     def get_status(self) -> Dict:
         """Get system status"""
         try:
-            # Check disk space
-            disk = subprocess.check_output(['df', '-h', '/']).decode()
-            
-            # Check memory
-            memory = subprocess.check_output(['free', '-h']).decode()
-            
-            # Check uptime
-            uptime = subprocess.check_output(['uptime']).decode()
-            
-            # Check service status
-            try:
-                cron_status = subprocess.check_output(['systemctl', 'is-active', 'cron']).decode().strip()
-            except:
-                cron_status = 'unknown'
+            # Read /proc and statvfs directly; shell out only where /proc is unavailable
+            if HAVE_PROC:
+                disk = disk_report('/')
+                memory = memory_report()
+                uptime = uptime_report()
+                cron_status = service_status('cron')
+            else:
+                def run(cmd):
+                    return subprocess.run(cmd, capture_output=True, text=True,
+                                          timeout=STATUS_COMMAND_TIMEOUT, check=True).stdout
+                disk = run(['df', '-h', '/'])
+                memory = run(['free', '-h'])
+                uptime = run(['uptime'])
+                try:
+                    cron_status = run(['systemctl', 'is-active', 'cron']).strip()
+                except:
+                    cron_status = 'unknown'
             
             return {
                 'success': True,
@@ -276,23 +568,24 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
             lines = params.get('lines', 50)
             log_file = params.get('log_file', 'akari_generator_api.log')
             
-            if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    log_lines = f.readlines()
-                    recent_logs = log_lines[-lines:] if len(log_lines) > lines else log_lines
-                
-                return {
-                    'success': True,
-                    'data': {
-                        'logs': recent_logs,
-                        'total_lines': len(log_lines)
-                    }
-                }
-            else:
+            try:
+                recent_logs = tail(log_file, lines)
+            except FileNotFoundError:
                 return {
                     'success': False,
                     'error': f'Log file not found: {log_file}'
                 }
+            
+            # Counting every line means reading the whole file, so only on request
+            total_lines = _count_lines(log_file) if params.get('count_lines') else None
+            
+            return {
+                'success': True,
+                'data': {
+                    'logs': recent_logs,
+                    'total_lines': total_lines
+                }
+            }
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -300,31 +593,26 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
     def update_config(self, params: Dict) -> Dict:
         """Update configuration"""
         try:
-            # Update config file
-            config_path = 'config/generator_config.json'
-            
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    current_config = json.load(f)
+            # Update config file; the lock keeps concurrent updates from losing each other's keys
+            with _CONFIG_LOCK:
+                # load_config() has just stat()ed the file; no mtime means it's missing
+                current_config = dict(load_config())
+                if _CONFIG_CACHE['mtime'] is None:
+                    return {
+                        'success': False,
+                        'error': 'Config file not found'
+                    }
                 
-                # Update with new params
+                # Update a copy of the cached config, then share it with every request
                 current_config.update(params)
-                
-                with open(config_path, 'w') as f:
-                    json.dump(current_config, f, indent=2)
-                
-                # Reload config
-                self.config = current_config
-                
-                return {
-                    'success': True,
-                    'message': 'Configuration updated'
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': 'Config file not found'
-                }
+                _write_config(current_config)
+            
+            self._reset_clients()
+            
+            return {
+                'success': True,
+                'message': 'Configuration updated'
+            }
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -332,12 +620,21 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
     def restart_service(self) -> Dict:
         """Restart puzzle generation service"""
         try:
-            # Restart cron service
-            subprocess.run(['sudo', 'systemctl', 'restart', 'cron'])
+            # Restart cron service in the background; -n fails fast instead of
+            # waiting on a password prompt. /api/status reports cron once it's back.
+            process = subprocess.Popen(
+                ['sudo', '-n', 'systemctl', 'restart', 'cron'],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+            logging.info(f"Restarting cron (pid {process.pid})")
             
             return {
                 'success': True,
-                'message': 'Service restarted'
+                'data': {'pid': process.pid},
+                'message': 'Service restart started'
             }
             
         except Exception as e:
@@ -347,23 +644,21 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
         """Get list of uploaded ebooks"""
         try:
             if 'cdn_bunny' in self.config:
-                uploader = CDNBunnyUploader(
-                    storage_zone=self.config['cdn_bunny']['storage_zone'],
-                    api_key=self.config['cdn_bunny']['api_key'],
-                    storage_zone_name=self.config['cdn_bunny']['storage_zone_name'],
-                    region=self.config['cdn_bunny']['region']
-                )
+                uploader = self._get_uploader()
                 
                 result = uploader.list_files("ebooks")
                 return result
             else:
                 # List local ebooks
                 ebooks_dir = 'ebooks'
-                if os.path.exists(ebooks_dir):
-                    files = [f for f in os.listdir(ebooks_dir) if f.endswith('.pdf')]
+                if os.path.isdir(ebooks_dir):
+                    # d_type from scandir spares a stat() per entry
+                    with os.scandir(ebooks_dir) as entries:
+                        files = [{'ObjectName': e.name} for e in entries
+                                 if e.name.endswith('.pdf') and e.is_file(follow_symlinks=False)]
                     return {
                         'success': True,
-                        'files': [{'ObjectName': f} for f in files]
+                        'files': files
                     }
                 else:
                     return {
@@ -374,24 +669,14 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @ttl_cache(30)
     def get_stats(self) -> Dict:
         """Get generation statistics"""
         try:
-            # Get puzzle stats from database via API
-            generator = AkariPuzzleGeneratorAPI(
-                self.config['api_url'],
-                self.config['api_key']
-            )
-            
             # Get CDN stats
             cdn_stats = None
             if 'cdn_bunny' in self.config:
-                uploader = CDNBunnyUploader(
-                    storage_zone=self.config['cdn_bunny']['storage_zone'],
-                    api_key=self.config['cdn_bunny']['api_key'],
-                    storage_zone_name=self.config['cdn_bunny']['storage_zone_name'],
-                    region=self.config['cdn_bunny']['region']
-                )
+                uploader = self._get_uploader()
                 cdn_stats = uploader.get_upload_stats()
             
             return {
@@ -405,47 +690,98 @@ class RPiAPIHandler(BaseHTTPRequestHandler):
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @requires_auth
     def handle_status(self):
         """Handle GET /api/status"""
-        if not self.validate_auth():
-            self.send_json_response({'success': False, 'error': 'Unauthorized'}, 401)
-            return
-        
         result = self.get_status()
         self.send_json_response(result)
     
+    @requires_auth
     def handle_logs(self):
         """Handle GET /api/logs"""
-        if not self.validate_auth():
-            self.send_json_response({'success': False, 'error': 'Unauthorized'}, 401)
-            return
-        
         # Parse query parameters
         parsed_url = urllib.parse.urlparse(self.path)
         params = urllib.parse.parse_qs(parsed_url.query)
         
+        lines = int(params.get('lines', [50])[0])
+        log_file = params.get('log_file', ['akari_generator_api.log'])[0]
+        
+        # ?format=text sends the raw tail as read from disk: no decoding, no JSON
+        if params.get('format', ['json'])[0] == 'text':
+            try:
+                body = tail_bytes(log_file, lines)
+            except FileNotFoundError:
+                self.send_json_response({'success': False, 'error': f'Log file not found: {log_file}'}, 404)
+                return
+            
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Connection', 'keep-alive')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        
         result = self.get_logs({
-            'lines': int(params.get('lines', [50])[0]),
-            'log_file': params.get('log_file', ['akari_generator_api.log'])[0]
+            'lines': lines,
+            'log_file': log_file,
+            'count_lines': params.get('count_lines', ['0'])[0] in ('1', 'true')
         })
         
         self.send_json_response(result)
     
+    @requires_auth
     def handle_stats(self):
         """Handle GET /api/stats"""
-        if not self.validate_auth():
-            self.send_json_response({'success': False, 'error': 'Unauthorized'}, 401)
-            return
-        
         result = self.get_stats()
         self.send_json_response(result)
+    
+    @requires_auth
+    def handle_ebook_download(self, filename: str):
+        """Handle GET /api/ebooks/<name>.pdf for locally kept ebooks"""
+        # Only plain file names inside ebooks/, never paths
+        if os.path.basename(filename) != filename or not filename.endswith('.pdf'):
+            self.send_json_response({'success': False, 'error': 'Invalid ebook name'}, 400)
+            return
+        
+        try:
+            f = open(os.path.join('ebooks', filename), 'rb')
+        except (FileNotFoundError, IsADirectoryError):
+            self.send_json_response({'success': False, 'error': f'Ebook not found: {filename}'}, 404)
+            return
+        
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(size))
+            self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+            self.send_header('Connection', 'keep-alive')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            # Zero-copy from the page cache to the socket (os.sendfile under the hood)
+            self.connection.sendfile(f, 0, size)
 
-def main():
-    print(f"🚀 Starting RPi API Server on {HOST}:{PORT}")
-    print(f"🔑 API Key: {API_KEY}")
+class PooledHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that hands connections to a fixed thread pool"""
     
-    # Create server
-    server = HTTPServer((HOST, PORT), RPiAPIHandler)
+    def __init__(self, server_address, handler_class, workers: int = CONNECTION_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rpi-http')
+    
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+    
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def serve():
+    """Run the server until interrupted"""
+    # Create server (pooled worker threads, so a slow request never blocks
+    # status polling and connections don't pay for a new thread)
+    server = PooledHTTPServer((HOST, PORT), RPiAPIHandler)
     
     # Optional: Add SSL
     # context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
@@ -453,14 +789,31 @@ def main():
     # server.socket = context.wrap_socket(server.socket, server_side=True)
     
     try:
-        print(f"✅ Server started. Listening on {HOST}:{PORT}")
         server.serve_forever()
+    finally:
+        server.server_close()
+
+def main():
+    print(f"🚀 Starting RPi API Server on {HOST}:{PORT}")
+    print(f"🔑 API Key: {API_KEY}")
+    
+    # Working directories are created once here, not on every request
+    for directory in ('ebooks', 'config'):
+        os.makedirs(directory, exist_ok=True)
+    
+    # One process: logs, caches and the command limits are shared by every request,
+    # and CPU-bound generation runs on puzzle_pool's processes
+    try:
+        print(f"✅ Server started. Listening on {HOST}:{PORT}")
+        serve()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except Exception as e:
         print(f"❌ Server error: {e}")
     finally:
-        server.server_close()
+        # Drop queued commands now: an atexit hook would run after concurrent.futures'
+        # own, which waits for the whole queue. Running commands still finish
+        EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
     main()
@@ -4,29 +4,91 @@ Raspberry Pi 5 HTML Ebook API Server
 Receives commands from dashboard and generates HTML ebooks with CDN Bunny integration
 """
 
+import hashlib
+import hmac
 import json
 import os
 import sys
 import time
 import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from enhanced_html_ebook_generator import EnhancedHTMLEbookGenerator
+import puzzle_pool
+from html_ebook_common import create_file_logger, safe_title
+
+# orjson serializes straight to bytes in C; fall back to the stdlib when it isn't installed
+try:
+    import orjson
+    
+    def _json_bytes(data) -> bytes:
+        return orjson.dumps(data)
+    
+    class ORJSONProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson (used by jsonify and request.get_json)"""
+        
+        def dumps(self, obj, **kwargs) -> str:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+except ImportError:
+    def _json_bytes(data) -> bytes:
+        return json.dumps(data).encode()
+    
+    ORJSONProvider = DefaultJSONProvider
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
+# Ebooks are generated on a fixed pool, leaving a core for the API; beyond
+# JOB_QUEUE_LIMIT queued or running jobs, new submissions get 429
+JOB_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+JOB_QUEUE_LIMIT = 8
+
+# nginx (see setup_rpi_html_ebook.sh) maps this internal location to the output
+# directory; proxied downloads are handed back to it with X-Accel-Redirect
+X_ACCEL_PREFIX = '/_ebooks/'
+
+# Upload bodies are sent in 1 MiB writes rather than http.client's 8-16 KiB blocks
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+class ChunkedReader:
+    """Read-only file wrapper that hands out at least `chunk_size` bytes per read().
+    
+    Still seekable (and has a fileno), so requests can size the body and
+    urllib3 can rewind it when a PUT is retried."""
+    
+    def __init__(self, f, chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+    
+    def read(self, size: int = -1) -> bytes:
+        if size is not None and 0 <= size < self.chunk_size:
+            size = self.chunk_size
+        return self.f.read(size)
+    
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
 class RPiHTMLEbookAPI:
     def __init__(self):
         self.api_key = 'shrine_puzzle_api_key_2024'
+        self._api_key_b = self.api_key.encode()
         self.config = {
             'api_url': 'https://shrinepuzzle.com/api/puzzle_receiver.php',
             'api_key': 'shrine_puzzle_api_key_2024',
             'output_dir': './generated_ebooks',
-            'log_file': './html_ebook_generation.log',
+            'log_file': './logs/html_ebook_generation.log',
             'cdn_bunny': {
                 'storage_zone': 'shrinepuzzle-ebooks',
                 'api_key': 'your_cdn_bunny_api_key_here',
@@ -35,32 +97,138 @@ class RPiHTMLEbookAPI:
         }
         
         self.generator = EnhancedHTMLEbookGenerator(self.config)
-        self.active_jobs = {}
+        self.logger = create_file_logger(__name__, self.config['log_file'])
         
         # Ensure output directory exists
         os.makedirs(self.config['output_dir'], exist_ok=True)
         
+        # Jobs are persisted to disk so their status survives a restart
+        self.jobs_file = os.path.join(self.config['output_dir'], 'jobs.json')
+        self._jobs_lock = threading.RLock()
+        self.active_jobs = self.load_jobs()
+        
+        self.executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='ebook-job')
+        # CDN uploads run here, freeing the job worker for the next generation
+        self.io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ebook-upload')
+        self._job_slots = threading.BoundedSemaphore(JOB_QUEUE_LIMIT)
+        
+        # One pooled session for CDN uploads and notifications, so repeated calls
+        # to storage.bunnycdn.com and shrinepuzzle.com reuse their TLS connections
+        self.http = requests.Session()
+        self.http.headers.update({'Connection': 'keep-alive'})
+        # Transient failures are retried with exponential backoff (0.5s, 1s, 2s, 4s).
+        # The CDN PUT targets a fixed path and notifications carry the job_id, so
+        # repeating either is harmless; POST is allowed for that reason.
+        retries = Retry(
+            total=4,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'POST'},
+            raise_on_status=False
+        )
+        self.http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries))
+        
     def log_message(self, message: str, job_id: str = None):
-        """Log message with timestamp"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        """Log message with timestamp to stdout and the log file (rotated at 10 MB)"""
         job_prefix = f"[{job_id}] " if job_id else ""
-        log_entry = f"[{timestamp}] {job_prefix}{message}"
-        print(log_entry)
+        self.logger.info(f"{job_prefix}{message}")
+    
+    def load_jobs(self) -> dict:
+        """Load persisted jobs; any that were still running when we stopped are marked failed"""
+        try:
+            with open(self.jobs_file, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            self.log_message(f"Ignoring unreadable jobs file: {str(e)}")
+            return {}
         
-        # Write to log file
-        with open(self.config['log_file'], 'a', encoding='utf-8') as f:
-            f.write(log_entry + '\n')
+        for job_id, job_info in jobs.items():
+            if job_info.get('status') in ('queued', 'generating'):
+                jobs[job_id] = {
+                    'status': 'failed',
+                    'progress': 0,
+                    'error': 'Interrupted by server restart',
+                    'failed_at': datetime.now().isoformat()
+                }
+        return jobs
+    
+    def save_jobs(self):
+        """Atomically write all jobs to the jobs file"""
+        with self._jobs_lock:
+            data = json.dumps(self.active_jobs)
+            tmp_path = f"{self.jobs_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.jobs_file)
     
     def verify_api_key(self, request):
         """Verify API key from request"""
-        api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
-        return api_key == self.api_key
+        api_key = request.headers.get('X-API-Key') or request.args.get('api_key', '')
+        # Constant-time compare so response timing doesn't reveal how much of the key matched
+        return hmac.compare_digest(api_key.encode(), self._api_key_b)
+    
+    def get_job(self, job_id: str) -> dict:
+        """Snapshot of one job's status ({} if unknown), safe to serialize"""
+        with self._jobs_lock:
+            return dict(self.active_jobs.get(job_id, {}))
+    
+    def update_job(self, job_id: str, **fields):
+        """Merge fields into a job's status without losing concurrent updates"""
+        with self._jobs_lock:
+            self.active_jobs.setdefault(job_id, {}).update(fields)
+    
+    @staticmethod
+    def request_key(sizes: list, difficulties: list, count: int, title: str) -> str:
+        """Short hash identifying the ebook a set of generation parameters produces"""
+        normalized = json.dumps({
+            'sizes': sorted(sizes),
+            'difficulties': sorted(set(difficulties)),
+            'count': count,
+            'title': title
+        }, sort_keys=True)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+    
+    def find_uploaded(self, request_key: str):
+        """(job_id, job) of an uploaded ebook with the same request key, or None"""
+        with self._jobs_lock:
+            for job_id, job_info in self.active_jobs.items():
+                if (job_info.get('request_key') == request_key and job_info.get('status') == 'uploaded'
+                        and job_info.get('cdn_url')):
+                    return job_id, dict(job_info)
+        return None
+    
+    def generate_puzzles(self, sizes: list, count: int, difficulties: list) -> list:
+        """Generate ebook puzzles with one process per size, in the same order as serially"""
+        # Only the requested difficulties are generated (deduplicated, order kept)
+        difficulties = list(dict.fromkeys(difficulties))
+        return puzzle_pool.generate_ebook_puzzles(self.generator.puzzle_generator, sizes, count,
+                                                  difficulties=difficulties)
+    
+    def submit_job(self, job_id: str, params: dict) -> bool:
+        """Queue a generation job on the worker pool; False when the queue is full"""
+        if not self._job_slots.acquire(blocking=False):
+            return False
+        
+        with self._jobs_lock:
+            self.active_jobs[job_id] = {'status': 'queued', 'progress': 0}
+        try:
+            future = self.executor.submit(self.generate_html_ebook, job_id, params)
+        except Exception:
+            with self._jobs_lock:
+                del self.active_jobs[job_id]
+            self._job_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._job_slots.release())
+        return True
     
     def generate_html_ebook(self, job_id: str, params: dict):
         """Generate HTML ebook in background thread"""
         try:
             self.log_message(f"Starting HTML ebook generation", job_id)
-            self.active_jobs[job_id] = {'status': 'generating', 'progress': 10}
+            self.update_job(job_id, status='generating', progress=10)
+            self.save_jobs()
             
             # Extract parameters
             sizes = params.get('sizes', [6, 8, 10])
@@ -70,12 +238,30 @@ class RPiHTMLEbookAPI:
             
             self.log_message(f"Parameters: sizes={sizes}, difficulties={difficulties}, count={count}", job_id)
             
-            # Generate puzzles
-            self.active_jobs[job_id]['progress'] = 30
-            puzzles = self.generator.puzzle_generator.generate_ebook_puzzles(sizes, count)
+            # An identical request that was already uploaded is served from the CDN
+            request_key = self.request_key(sizes, difficulties, count, title)
+            previous = None if params.get('force') else self.find_uploaded(request_key)
+            if previous:
+                previous_id, previous_job = previous
+                self.update_job(
+                    job_id,
+                    status='uploaded',
+                    progress=100,
+                    output_file=previous_job.get('output_file'),
+                    puzzle_count=previous_job.get('puzzle_count'),
+                    cdn_url=previous_job['cdn_url'],
+                    request_key=request_key,
+                    reused_from=previous_id,
+                    uploaded_at=datetime.now().isoformat()
+                )
+                self.log_message(f"Reusing ebook from job {previous_id}: {previous_job['cdn_url']}", job_id)
+                self.save_jobs()
+                self.notify_completion(job_id)
+                return
             
-            # Filter by difficulties
-            puzzles = [p for p in puzzles if p['difficulty'] in difficulties]
+            # Generate puzzles
+            self.update_job(job_id, progress=30)
+            puzzles = self.generate_puzzles(sizes, count, difficulties)
             
             if not puzzles:
                 raise Exception("No puzzles generated with specified parameters")
@@ -83,12 +269,11 @@ class RPiHTMLEbookAPI:
             self.log_message(f"Generated {len(puzzles)} puzzles", job_id)
             
             # Create output filename
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            safe_title = safe_title.replace(' ', '_')
+            safe_title = safe_title(title)
             output_file = os.path.join(self.config['output_dir'], f"akari_ebook_{job_id}_{safe_title}.html")
             
             # Generate HTML ebook
-            self.active_jobs[job_id]['progress'] = 60
+            self.update_job(job_id, progress=60)
             self.generator.generate_ebook(
                 puzzles, 
                 output_file, 
@@ -100,41 +285,57 @@ class RPiHTMLEbookAPI:
             self.log_message(f"HTML ebook generated: {output_file}", job_id)
             
             # Update job status
-            self.active_jobs[job_id] = {
-                'status': 'completed',
-                'progress': 90,
-                'output_file': output_file,
-                'puzzle_count': len(puzzles),
-                'completed_at': datetime.now().isoformat()
-            }
+            self.update_job(
+                job_id,
+                status='completed',
+                progress=90,
+                output_file=output_file,
+                puzzle_count=len(puzzles),
+                request_key=request_key,
+                completed_at=datetime.now().isoformat()
+            )
             
-            # Upload to CDN Bunny
-            self.active_jobs[job_id]['progress'] = 95
-            cdn_result = self.upload_to_cdn_bunny(output_file, title, job_id)
+            # Upload to CDN Bunny in the background; the main server is notified when it's done
+            self.update_job(job_id, progress=95)
+            self.save_jobs()
+            upload_future = self.io_executor.submit(self.upload_to_cdn_bunny, output_file, title, job_id)
+            upload_future.add_done_callback(lambda future: self._on_upload_complete(job_id, future))
+            
+        except Exception as e:
+            self.log_message(f"Generation failed: {str(e)}", job_id)
+            with self._jobs_lock:
+                self.active_jobs[job_id] = {
+                    'status': 'failed',
+                    'progress': 0,
+                    'error': str(e),
+                    'failed_at': datetime.now().isoformat()
+                }
+            self.save_jobs()
+            self.notify_completion(job_id)
+    
+    def _on_upload_complete(self, job_id: str, future):
+        """Record a finished CDN upload and notify the main server"""
+        try:
+            cdn_result = future.result()
             
             if cdn_result['success']:
-                self.active_jobs[job_id].update({
-                    'status': 'uploaded',
-                    'progress': 100,
-                    'cdn_url': cdn_result['cdn_url'],
-                    'uploaded_at': datetime.now().isoformat()
-                })
+                self.update_job(
+                    job_id,
+                    status='uploaded',
+                    progress=100,
+                    cdn_url=cdn_result['cdn_url'],
+                    uploaded_at=datetime.now().isoformat()
+                )
                 self.log_message(f"Uploaded to CDN: {cdn_result['cdn_url']}", job_id)
             else:
                 self.log_message(f"CDN upload failed: {cdn_result['error']}", job_id)
             
-            # Notify main server of completion
-            self.notify_completion(job_id)
-            
+            self.save_jobs()
         except Exception as e:
-            self.log_message(f"Generation failed: {str(e)}", job_id)
-            self.active_jobs[job_id] = {
-                'status': 'failed',
-                'progress': 0,
-                'error': str(e),
-                'failed_at': datetime.now().isoformat()
-            }
-            self.notify_completion(job_id)
+            self.log_message(f"Error recording upload: {str(e)}", job_id)
+        
+        # Notify main server of completion
+        self.notify_completion(job_id)
     
     def upload_to_cdn_bunny(self, file_path: str, title: str, job_id: str):
         """Upload file to CDN Bunny"""
@@ -146,13 +347,16 @@ class RPiHTMLEbookAPI:
             
             url = f"https://storage.bunnycdn.com/{self.config['cdn_bunny']['storage_zone']}/{cdn_filename}"
             
+            # Sent uncompressed: the Storage PUT API documents no Content-Encoding, so a
+            # gzipped body could be served back as raw gzip; the pull zone compresses for clients
             with open(file_path, 'rb') as f:
                 headers = {
                     'AccessKey': self.config['cdn_bunny']['api_key'],
                     'Content-Type': 'text/html'
                 }
                 
-                response = requests.put(url, data=f, headers=headers, timeout=60)
+                # (connect, read) timeouts: fail fast on a dead link, allow slow uploads
+                response = self.http.put(url, data=ChunkedReader(f), headers=headers, timeout=(10, 300))
                 
                 if response.status_code == 201:
                     cdn_url = f"{self.config['cdn_bunny']['pull_zone']}/{cdn_filename}"
@@ -181,7 +385,7 @@ class RPiHTMLEbookAPI:
     def notify_completion(self, job_id: str):
         """Notify main server of job completion"""
         try:
-            job_info = self.active_jobs.get(job_id, {})
+            job_info = self.get_job(job_id)
             
             notification_data = {
                 'job_id': job_id,
@@ -196,12 +400,15 @@ class RPiHTMLEbookAPI:
             # Send notification to main server
             main_server_url = 'https://shrinepuzzle.com/api/html_ebook_controller.php?action=notify'
             
-            response = requests.post(
+            # job_id in the URL and an idempotency key let the main server drop retried duplicates
+            response = self.http.post(
                 main_server_url,
-                json=notification_data,
+                params={'job_id': job_id},
+                data=_json_bytes(notification_data),
                 headers={
                     'Content-Type': 'application/json',
-                    'X-API-Key': self.api_key
+                    'X-API-Key': self.api_key,
+                    'Idempotency-Key': f"{job_id}:{notification_data['status']}"
                 },
                 timeout=30
             )
@@ -214,8 +421,9 @@ class RPiHTMLEbookAPI:
         except Exception as e:
             self.log_message(f"Error notifying main server: {str(e)}", job_id)
 
-# Initialize API
-api = RPiHTMLEbookAPI()
+# Initialize API (not in puzzle_pool's workers, which import this script as __mp_main__)
+if __name__ != '__mp_main__':
+    api = RPiHTMLEbookAPI()
 
 @app.route('/api/html_ebook_generator', methods=['POST'])
 def handle_ebook_generation():
@@ -239,17 +447,14 @@ def handle_ebook_generation():
         if not job_id:
             return jsonify({'success': False, 'error': 'Missing job_id'}), 400
         
-        # Check if job is already running
-        if job_id in api.active_jobs:
-            return jsonify({'success': False, 'error': 'Job already running'}), 409
-        
-        # Start generation in background thread
-        thread = threading.Thread(
-            target=api.generate_html_ebook,
-            args=(job_id, params)
-        )
-        thread.daemon = True
-        thread.start()
+        # Check-and-queue under the lock, so two requests can't both start a job_id
+        with api._jobs_lock:
+            if job_id in api.active_jobs:
+                return jsonify({'success': False, 'error': 'Job already running'}), 409
+            
+            # Start generation on the worker pool, shedding load when it's full
+            if not api.submit_job(job_id, params):
+                return jsonify({'success': False, 'error': 'Too many jobs in progress, try again later'}), 429
         
         api.log_message(f"Job queued for generation", job_id)
         
@@ -270,7 +475,7 @@ def get_job_status(job_id):
     if not api.verify_api_key(request):
         return jsonify({'success': False, 'error': 'Invalid API key'}), 401
     
-    job_info = api.active_jobs.get(job_id, {})
+    job_info = api.get_job(job_id)
     
     if not job_info:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
@@ -288,11 +493,12 @@ def list_jobs():
         return jsonify({'success': False, 'error': 'Invalid API key'}), 401
     
     jobs = []
-    for job_id, job_info in api.active_jobs.items():
-        jobs.append({
-            'job_id': job_id,
-            **job_info
-        })
+    with api._jobs_lock:
+        for job_id, job_info in api.active_jobs.items():
+            jobs.append({
+                'job_id': job_id,
+                **job_info
+            })
     
     return jsonify({
         'success': True,
@@ -306,7 +512,7 @@ def download_ebook(job_id):
     if not api.verify_api_key(request):
         return jsonify({'success': False, 'error': 'Invalid API key'}), 401
     
-    job_info = api.active_jobs.get(job_id, {})
+    job_info = api.get_job(job_id)
     
     if not job_info:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
@@ -339,7 +545,7 @@ def serve_ebook_file(job_id):
     if not api.verify_api_key(request):
         return jsonify({'success': False, 'error': 'Invalid API key'}), 401
     
-    job_info = api.active_jobs.get(job_id, {})
+    job_info = api.get_job(job_id)
     
     if not job_info:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
@@ -349,12 +555,20 @@ def serve_ebook_file(job_id):
     if not output_file or not os.path.exists(output_file):
         return jsonify({'success': False, 'error': 'File not found'}), 404
     
-    # Serve file with proper headers
-    from flask import send_file
-    return send_file(
-        output_file,
+    filename = Path(output_file).name
+    
+    # Behind nginx, let it stream the file with sendfile(2) instead of Python
+    if request.headers.get('X-Sendfile-Type') == 'X-Accel-Redirect':
+        response = app.response_class(mimetype='text/html')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + urllib.parse.quote(filename)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    # Serve file with proper headers (gunicorn sends the file wrapper with sendfile too)
+    return send_from_directory(
+        api.config['output_dir'],
+        filename,
         as_attachment=True,
-        download_name=Path(output_file).name,
         mimetype='text/html'
     )
 
@@ -379,30 +593,38 @@ def cleanup_old_files():
         cutoff_time = time.time() - (7 * 24 * 60 * 60)
         deleted_count = 0
         
-        for file_path in Path(api.config['output_dir']).glob("*.html"):
-            if file_path.stat().st_mtime < cutoff_time:
-                file_path.unlink()
-                deleted_count += 1
-                api.log_message(f"Deleted old file: {file_path.name}")
+        # One directory read; each entry is stat()ed once
+        with os.scandir(api.config['output_dir']) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.html') or not entry.is_file():
+                    continue
+                if entry.stat().st_mtime < cutoff_time:
+                    os.unlink(entry.path)
+                    deleted_count += 1
+                    api.log_message(f"Deleted old file: {entry.name}")
         
         # Clean up completed jobs older than 24 hours
         current_time = datetime.now()
         jobs_to_remove = []
         
-        for job_id, job_info in api.active_jobs.items():
-            if job_info.get('status') in ['completed', 'uploaded', 'failed']:
-                completed_at = job_info.get('completed_at') or job_info.get('uploaded_at') or job_info.get('failed_at')
-                if completed_at:
-                    try:
-                        completed_time = datetime.fromisoformat(completed_at)
-                        if (current_time - completed_time).total_seconds() > 24 * 60 * 60:
-                            jobs_to_remove.append(job_id)
-                    except:
-                        pass
-        
-        for job_id in jobs_to_remove:
-            del api.active_jobs[job_id]
-            api.log_message(f"Removed old job: {job_id}")
+        with api._jobs_lock:
+            for job_id, job_info in api.active_jobs.items():
+                if job_info.get('status') in ['completed', 'uploaded', 'failed']:
+                    completed_at = job_info.get('completed_at') or job_info.get('uploaded_at') or job_info.get('failed_at')
+                    if completed_at:
+                        try:
+                            completed_time = datetime.fromisoformat(completed_at)
+                            if (current_time - completed_time).total_seconds() > 24 * 60 * 60:
+                                jobs_to_remove.append(job_id)
+                        except:
+                            pass
+            
+            for job_id in jobs_to_remove:
+                del api.active_jobs[job_id]
+                api.log_message(f"Removed old job: {job_id}")
+            
+            if jobs_to_remove:
+                api.save_jobs()
         
         return jsonify({
             'success': True,
@@ -415,7 +637,7 @@ def cleanup_old_files():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Run the Flask app
+    # Run the Flask development server; the service runs the app under gunicorn
     port = int(os.environ.get('PORT', 8080))
     api.log_message(f"Starting RPi HTML Ebook API server on port {port}")
     
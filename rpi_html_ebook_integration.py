@@ -8,9 +8,11 @@ import os
 import sys
 import json
 import argparse
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, List
 from enhanced_html_ebook_generator import EnhancedHTMLEbookGenerator
+from html_ebook_common import create_file_logger, safe_title
 
 class RPiHTMLEbookIntegration:
     def __init__(self, config: Dict):
@@ -19,20 +21,15 @@ class RPiHTMLEbookIntegration:
         
         # RPi-specific paths
         self.output_dir = config.get('output_dir', './generated_ebooks')
-        self.log_file = config.get('log_file', './html_ebook_generation.log')
+        self.log_file = config.get('log_file', './logs/html_ebook_integration.log')
+        self.logger = create_file_logger(__name__, self.log_file)
         
         # Ensure output directory exists
         os.makedirs(self.output_dir, exist_ok=True)
         
     def log_message(self, message: str):
-        """Log message with timestamp"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = f"[{timestamp}] {message}"
-        print(log_entry)
-        
-        # Write to log file
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_entry + '\n')
+        """Log message with timestamp to stdout and the log file (rotated at 10 MB)"""
+        self.logger.info(message)
     
     def generate_daily_ebook(self, date_str: str = None):
         """Generate daily HTML ebook with puzzles from database"""
@@ -121,18 +118,17 @@ class RPiHTMLEbookIntegration:
         
         try:
             # Generate puzzles
-            puzzles = self.html_generator.puzzle_generator.generate_ebook_puzzles(sizes, count)
-            
-            # Filter by difficulties
-            puzzles = [p for p in puzzles if p['difficulty'] in difficulties]
+            # Only the requested difficulties are generated (deduplicated, order kept)
+            puzzles = self.html_generator.puzzle_generator.generate_ebook_puzzles(
+                sizes, count, difficulties=list(dict.fromkeys(difficulties))
+            )
             
             if not puzzles:
                 self.log_message("No puzzles generated with specified parameters")
                 return False
             
             # Create output filename
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            safe_title = safe_title.replace(' ', '_')
+            safe_title = safe_title(title)
             output_file = os.path.join(self.output_dir, f"akari_custom_{safe_title}.html")
             
             # Generate HTML ebook
@@ -153,6 +149,12 @@ class RPiHTMLEbookIntegration:
             self.log_message(f"Error generating custom ebook: {e}")
             return False
     
+    def _scan_ebooks(self):
+        """(DirEntry, stat) for each HTML ebook, from one directory read and one stat per file"""
+        with os.scandir(self.output_dir) as entries:
+            return [(entry, entry.stat()) for entry in entries
+                    if entry.name.endswith('.html') and entry.is_file()]
+    
     def cleanup_old_ebooks(self, days_to_keep: int = 30):
         """Clean up old HTML ebooks"""
         self.log_message(f"Cleaning up ebooks older than {days_to_keep} days")
@@ -161,11 +163,12 @@ class RPiHTMLEbookIntegration:
             cutoff_date = datetime.now() - timedelta(days=days_to_keep)
             deleted_count = 0
             
-            for file_path in Path(self.output_dir).glob("*.html"):
-                if file_path.stat().st_mtime < cutoff_date.timestamp():
-                    file_path.unlink()
+            cutoff_time = cutoff_date.timestamp()
+            for entry, st in self._scan_ebooks():
+                if st.st_mtime < cutoff_time:
+                    os.unlink(entry.path)
                     deleted_count += 1
-                    self.log_message(f"Deleted old ebook: {file_path.name}")
+                    self.log_message(f"Deleted old ebook: {entry.name}")
             
             self.log_message(f"Cleanup complete: deleted {deleted_count} old ebooks")
             return deleted_count
@@ -179,18 +182,17 @@ class RPiHTMLEbookIntegration:
         self.log_message("Listing generated HTML ebooks:")
         
         try:
-            ebooks = list(Path(self.output_dir).glob("*.html"))
+            ebooks = sorted(self._scan_ebooks(), key=lambda item: item[1].st_mtime, reverse=True)
             
             if not ebooks:
                 self.log_message("No HTML ebooks found")
                 return []
             
-            for ebook in sorted(ebooks, key=lambda x: x.stat().st_mtime, reverse=True):
-                size = ebook.stat().st_size
-                modified = datetime.fromtimestamp(ebook.stat().st_mtime)
-                self.log_message(f"  {ebook.name} ({size:,} bytes, {modified.strftime('%Y-%m-%d %H:%M')})")
+            for entry, st in ebooks:
+                modified = datetime.fromtimestamp(st.st_mtime)
+                self.log_message(f"  {entry.name} ({st.st_size:,} bytes, {modified.strftime('%Y-%m-%d %H:%M')})")
             
-            return ebooks
+            return [Path(entry.path) for entry, _ in ebooks]
             
         except Exception as e:
             self.log_message(f"Error listing ebooks: {e}")
@@ -222,7 +224,7 @@ def main():
         'api_url': 'https://shrinepuzzle.com/api/puzzle_receiver.php',
         'api_key': 'shrine_puzzle_api_key_2024',
         'output_dir': args.output_dir,
-        'log_file': './html_ebook_generation.log'
+        'log_file': './logs/html_ebook_integration.log'
     }
     
     # Create integration instance
@@ -260,5 +262,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    from datetime import timedelta
     main()
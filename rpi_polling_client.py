@@ -4,64 +4,177 @@ Raspberry Pi Polling Client
 Sends status updates and checks for commands from the web server
 """
 
+import atexit
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import select
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import subprocess
+from collections import deque
+from rpi_sysinfo import (HAVE_PROC, disk_report, iso_timestamp, json_bytes, json_loads,
+                         json_sorted_bytes, memory_report, pending_commands, service_status,
+                         status_body, tail, uptime_report)
 
-# Configure logging
+# Configure logging: records are queued and written by a listener thread, so
+# the polling loop never waits on the log file
+_log_queue = queue.Queue(-1)
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+# Rotated at 1 MB so the log (and the status tail of it) can't grow without bound on the SD card
+_log_handlers = [
+    logging.handlers.RotatingFileHandler('logs/rpi_polling.log', maxBytes=1_000_000, backupCount=3,
+                                         encoding='utf-8'),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/rpi_polling.log'),
-        logging.StreamHandler()
-    ]
+    format='%(message)s',  # the listener's handlers add time and level
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
 )
+_log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+CONFIG_PATH = 'config/generator_config.json'
+
+# Unchanged status isn't posted to rpi_status.php again, except at least this
+# often (seconds) so the server knows the Pi is alive
+STATUS_FULL_INTERVAL = 300
+# Fields that change every cycle and so are left out of the change check
+_VOLATILE_STATUS_FIELDS = ('timestamp', 'uptime')
+
+# Long-running commands; they run on a worker thread so polling carries on meanwhile
+BACKGROUND_ACTIONS = {'generate_puzzles', 'generate_ebook'}
+
+# Seconds each status command may take (systemctl can hang during boot), and a service restart
+STATUS_COMMAND_TIMEOUT = 5
+RESTART_TIMEOUT = 60
+
+# Fallback for systems without /proc
+_STATUS_COMMANDS = {
+    'uptime': ['/usr/bin/uptime'],
+    'disk': ['/bin/df', '-h', '/'],
+    'memory': ['/usr/bin/free', '-h'],
+    'api_status': ['/bin/systemctl', 'is-active', 'akari-api.service'],
+}
 
 class RPIPollingClient:
-    def __init__(self, web_server_url: str, api_key: str, poll_interval: int = 30):
+    def __init__(self, web_server_url: str, api_key: str, poll_interval: int = 30,
+                 min_poll_interval: int = 2, max_poll_interval: int = 120, long_poll_wait: int = 0,
+                 use_heartbeat: bool = False, wake_socket: Optional[str] = None,
+                 gzip_status: bool = False):
         self.web_server_url = web_server_url
         self.api_key = api_key
+        self._status_url = f"{web_server_url}/api/rpi_status.php"
+        self._heartbeat_url = f"{web_server_url}/api/rpi_heartbeat.php"
+        self._cmd_url = f"{web_server_url}/api/rpi_commands.php"
+        self._result_url = f"{web_server_url}/api/rpi_result.php"
+        self._hostname = os.uname().nodename
+        # Local Unix datagram socket: any datagram sent to it ends the current
+        # wait, so a local process can trigger a poll without waiting a full cycle
+        self.wake_socket = self._open_wake_socket(wake_socket) if wake_socket else None
         self.poll_interval = poll_interval
+        # Send status and collect commands in one rpi_heartbeat.php call; falls
+        # back to the separate endpoints if the server doesn't have it
+        self.use_heartbeat = use_heartbeat
+        # Gzip large status bodies; only for a server that inflates request bodies
+        # (the PHP endpoints don't on their own)
+        self.gzip_status = gzip_status
+        # Poll again quickly after a command, back off from poll_interval up to
+        # max_poll_interval while idle; with long_poll_wait the server holds each
+        # command check open for up to that many seconds instead
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max(max_poll_interval, poll_interval)
+        self.long_poll_wait = long_poll_wait
+        self.empty_polls = 0
+        # Consecutive failed cycles, for the error backoff; set when the last
+        # command check or heartbeat got no answer from the server
+        self._failures = 0
+        self.last_poll_failed = False
+        # Recent gaps between commands; idle polls are placed at their quantiles
+        self.command_gaps = deque(maxlen=50)
+        self.last_command_at = None
+        self.polls_per_gap = 8
+        # One small keep-alive pool: status, commands and results all go to
+        # web_server_url, so they reuse connections instead of new TLS handshakes
         self.session = requests.Session()
+        # Transient gateway errors are retried with backoff (0.5s, 1s, 2s); the final
+        # status still reaches the callers' logging
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                        allowed_methods=['GET', 'POST'], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Status uploads run beside the command check instead of ahead of it
+        self.status_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rpi-status')
+        # BACKGROUND_ACTIONS run one at a time here; their results are sent when they finish
+        self.command_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rpi-cmd')
+        # Background commands queued or running, by command_id, so one the server
+        # hands out again before it has a result isn't run twice
+        self._inflight: Dict[str, Future] = {}
+        
+        # Parsed config (re-read only when its mtime changes) and the generator and
+        # uploader built from it, kept warm between commands
+        self._config = None
+        self._config_mtime = None
+        self._clients = {}
+        
+        # Hash of the last status sent in full, and when it was sent
+        self._last_status_hash = None
+        self._last_full_status_at = 0.0
         
         # Headers for all requests
         self.headers = {
             'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive'
         }
+        # Sent with every request on the session, so calls don't pass them each time
+        self.session.headers.update(self.headers)
     
-    def get_system_status(self) -> Dict:
+    def get_system_status(self, now_iso: Optional[str] = None) -> Dict:
         """Get current system status"""
+        timestamp = now_iso or iso_timestamp()
         try:
-            # Get uptime
-            uptime = subprocess.check_output(['/usr/bin/uptime']).decode().strip()
-            
-            # Get disk usage
-            disk = subprocess.check_output(['/bin/df', '-h', '/']).decode().strip()
-            
-            # Get memory usage
-            memory = subprocess.check_output(['/usr/bin/free', '-h']).decode().strip()
-            
-            # Check service status
-            api_status = subprocess.check_output(['/bin/systemctl', 'is-active', 'akari-api.service']).decode().strip()
+            # Read /proc and statvfs directly; shell out only where /proc is unavailable
+            if HAVE_PROC:
+                uptime = uptime_report().strip()
+                disk = disk_report('/').strip()
+                memory = memory_report().strip()
+                api_status = service_status('akari-api')
+            else:
+                # Run the four tools at once so collection takes the slowest, not their sum
+                with ThreadPoolExecutor(max_workers=len(_STATUS_COMMANDS)) as pool:
+                    outputs = {key: pool.submit(subprocess.run, cmd, capture_output=True, text=True,
+                                                timeout=STATUS_COMMAND_TIMEOUT, check=True)
+                               for key, cmd in _STATUS_COMMANDS.items()}
+                    uptime, disk, memory, api_status = (
+                        outputs[key].result().stdout.strip()
+                        for key in ('uptime', 'disk', 'memory', 'api_status')
+                    )
             
             # Get recent log entries
             log_file = 'logs/akari_generator_api.log'
             recent_logs = []
             if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    lines = f.readlines()
-                    recent_logs = lines[-10:]  # Last 10 lines
+                recent_logs = tail(log_file, 10)  # Last 10 lines
             
             return {
-                'timestamp': datetime.now().isoformat(),
-                'hostname': os.uname().nodename,
+                'timestamp': timestamp,
+                'hostname': self._hostname,
                 'uptime': uptime,
                 'disk_usage': disk,
                 'memory_usage': memory,
@@ -72,25 +185,48 @@ class RPIPollingClient:
         except Exception as e:
             logging.error(f"Error getting system status: {str(e)}")
             return {
-                'timestamp': datetime.now().isoformat(),
-                'hostname': os.uname().nodename,
+                'timestamp': timestamp,
+                'hostname': self._hostname,
                 'online': True,
                 'error': str(e)
             }
     
-    def send_status_update(self) -> bool:
+    def status_payload(self, now_iso: Optional[str] = None):
+        """Body for a status POST, its hash (recorded once it's delivered), and whether
+        it repeats the last delivered status from under STATUS_FULL_INTERVAL ago"""
+        status = self.get_system_status(now_iso)
+        stable = {key: value for key, value in status.items() if key not in _VOLATILE_STATUS_FIELDS}
+        digest = hashlib.blake2b(json_sorted_bytes(stable), digest_size=16).hexdigest()
+        
+        unchanged = (digest == self._last_status_hash and
+                     time.monotonic() - self._last_full_status_at < STATUS_FULL_INTERVAL)
+        return {'status': status, 'hash': digest}, digest, unchanged
+    
+    def status_delivered(self, digest: str):
+        """Remember a status the server accepted"""
+        self._last_status_hash = digest
+        self._last_full_status_at = time.monotonic()
+    
+    def send_status_update(self, now_iso: Optional[str] = None) -> bool:
         """Send status update to web server"""
         try:
-            status = self.get_system_status()
+            payload, digest, unchanged = self.status_payload(now_iso)
+            if unchanged:
+                # Nothing but the clock changed: skip the POST rather than send the
+                # server a partial status it may store over the full one
+                logging.info("Status unchanged, update skipped")
+                return True
+            body, headers = status_body(payload, self.gzip_status)
             
             response = self.session.post(
-                f"{self.web_server_url}/api/rpi_status.php",
-                json={'status': status},
-                headers=self.headers,
+                self._status_url,
+                data=body,
+                headers=headers,
                 timeout=30
             )
             
             if response.status_code == 200:
+                self.status_delivered(digest)
                 logging.info("Status update sent successfully")
                 return True
             else:
@@ -101,64 +237,133 @@ class RPIPollingClient:
             logging.error(f"Error sending status update: {str(e)}")
             return False
     
-    def check_for_commands(self) -> Optional[Dict]:
-        """Check for commands from web server"""
+    def heartbeat(self, now_iso: Optional[str] = None) -> List[Dict]:
+        """Send status and receive pending commands in a single round trip"""
+        self.last_poll_failed = True
         try:
-            response = self.session.get(
-                f"{self.web_server_url}/api/rpi_commands.php",
-                headers=self.headers,
+            # Always the full status: this POST is also how commands are collected
+            payload, digest, _ = self.status_payload(now_iso)
+            body, headers = status_body(payload, self.gzip_status)
+            
+            response = self.session.post(
+                self._heartbeat_url,
+                data=body,
+                headers=headers,
                 timeout=30
             )
             
             if response.status_code == 200:
-                data = response.json()
-                if data.get('has_commands'):
-                    logging.info(f"Received command: {data.get('command')}")
-                    return data
-                else:
-                    return None
+                self.status_delivered(digest)
+                commands = json_loads(response.content).get('commands') or []
+                self.last_poll_failed = False
+                for command_data in commands:
+                    logging.info(f"Received command: {command_data.get('command')}")
+                return commands
+            elif response.status_code == 404:
+                logging.warning("Heartbeat endpoint not available, using separate status and command calls")
+                self.use_heartbeat = False
+                self.last_poll_failed = False
+            else:
+                logging.error(f"Heartbeat failed: HTTP {response.status_code}")
+            return []
+            
+        except Exception as e:
+            logging.error(f"Error sending heartbeat: {str(e)}")
+            return []
+    
+    def check_for_commands(self) -> List[Dict]:
+        """Check for commands from web server (every queued one, if the server sends them all)"""
+        self.last_poll_failed = True
+        try:
+            response = self.session.get(
+                self._cmd_url,
+                params={'wait': self.long_poll_wait} if self.long_poll_wait else None,
+                timeout=self.long_poll_wait + 30
+            )
+            
+            if response.status_code == 200:
+                commands = pending_commands(json_loads(response.content))
+                self.last_poll_failed = False
+                for command_data in commands:
+                    logging.info(f"Received command: {command_data.get('command')}")
+                return commands
             else:
                 logging.error(f"Command check failed: HTTP {response.status_code}")
-                return None
+                return []
                 
         except Exception as e:
             logging.error(f"Error checking for commands: {str(e)}")
-            return None
+            return []
+    
+    # Action name -> handler(self, params, now_iso), resolved with one dict lookup
+    _DISPATCH = {
+        'generate_puzzles': lambda self, params, now_iso: self.generate_puzzles(params),
+        'generate_ebook': lambda self, params, now_iso: self.generate_ebook(params),
+        'get_logs': lambda self, params, now_iso: self.get_logs(params, now_iso),
+        'restart_service': lambda self, params, now_iso: self.restart_service(now_iso),
+    }
     
-    def execute_command(self, command: Dict) -> Dict:
+    def execute_command(self, command: Dict, now_iso: Optional[str] = None) -> Dict:
         """Execute a command and return results"""
         try:
             action = command.get('action')
             params = command.get('params', {})
             
-            if action == 'generate_puzzles':
-                return self.generate_puzzles(params)
-            elif action == 'generate_ebook':
-                return self.generate_ebook(params)
-            elif action == 'get_logs':
-                return self.get_logs(params)
-            elif action == 'restart_service':
-                return self.restart_service()
-            else:
+            handler = self._DISPATCH.get(action)
+            if handler is None:
                 return {'success': False, 'error': f'Unknown action: {action}'}
+            return handler(self, params, now_iso)
                 
         except Exception as e:
             logging.error(f"Error executing command: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def load_config(self) -> Dict:
+        """Generator config, parsed again only after the file changes"""
+        mtime = os.stat(CONFIG_PATH).st_mtime
+        if self._config is None or mtime != self._config_mtime:
+            with open(CONFIG_PATH, 'r') as f:
+                self._config = json.load(f)
+            self._config_mtime = mtime
+        return self._config
+    
+    def _shared_client(self, name: str, key, factory):
+        """Client cached under name, rebuilt when key (its config) changes"""
+        cached = self._clients.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, factory())
+            self._clients[name] = cached
+        return cached[1]
+    
+    def _get_puzzle_generator(self, config: Dict):
+        def factory():
+            from akari_generator_api import AkariPuzzleGeneratorAPI
+            return AkariPuzzleGeneratorAPI(config['api_url'], config['api_key'])
+        return self._shared_client('puzzle_generator', (config['api_url'], config['api_key']), factory)
+    
+    def _get_ebook_generator(self, config: Dict):
+        def factory():
+            from ebook_generator import EbookGenerator
+            return EbookGenerator(config)
+        return self._shared_client('ebook_generator', json.dumps(config, sort_keys=True), factory)
+    
+    def _get_uploader(self, config: Dict):
+        cdn_config = config['cdn_bunny']
+        
+        def factory():
+            from cdn_bunny_uploader import CDNBunnyUploader
+            return CDNBunnyUploader(
+                cdn_config['storage_zone'],
+                cdn_config['password'],
+                cdn_config['storage_zone_name'],
+                cdn_config['region']
+            )
+        return self._shared_client('uploader', json.dumps(cdn_config, sort_keys=True), factory)
+    
     def generate_puzzles(self, params: Dict) -> Dict:
         """Generate puzzles"""
         try:
-            from akari_generator_api import AkariPuzzleGeneratorAPI
-            
-            # Load config
-            with open('config/generator_config.json', 'r') as f:
-                config = json.load(f)
-            
-            generator = AkariPuzzleGeneratorAPI(
-                config['api_url'],
-                config['api_key']
-            )
+            generator = self._get_puzzle_generator(self.load_config())
             
             sizes = params.get('sizes', [6, 8])
             difficulties = params.get('difficulties', ['easy', 'medium'])
@@ -176,7 +381,7 @@ class RPIPollingClient:
                 'success': True,
                 'action': 'generate_puzzles',
                 'result': result,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_timestamp()
             }
             
         except Exception as e:
@@ -185,13 +390,8 @@ class RPIPollingClient:
     def generate_ebook(self, params: Dict) -> Dict:
         """Generate ebook"""
         try:
-            from ebook_generator import EbookGenerator
-            
-            # Load config
-            with open('config/generator_config.json', 'r') as f:
-                config = json.load(f)
-            
-            generator = EbookGenerator(config)
+            config = self.load_config()
+            generator = self._get_ebook_generator(config)
             
             title = params.get('title', 'Akari Puzzle Collection')
             sizes = params.get('sizes', [6, 8])
@@ -199,8 +399,7 @@ class RPIPollingClient:
             count = params.get('count', 20)
             
             # Generate puzzles first
-            from akari_generator_api import AkariPuzzleGeneratorAPI
-            puzzle_gen = AkariPuzzleGeneratorAPI(config['api_url'], config['api_key'])
+            puzzle_gen = self._get_puzzle_generator(config)
             puzzles = puzzle_gen.generate_puzzles_for_ebook(sizes, difficulties, count)
             
             # Generate PDF
@@ -211,14 +410,7 @@ class RPIPollingClient:
             generator.generate_ebook(puzzles, filepath, title)
             
             # Upload to CDN
-            from cdn_bunny_uploader import CDNBunnyUploader
-            cdn_config = config['cdn_bunny']
-            uploader = CDNBunnyUploader(
-                cdn_config['storage_zone'],
-                cdn_config['password'],
-                cdn_config['storage_zone_name'],
-                cdn_config['region']
-            )
+            uploader = self._get_uploader(config)
             
             upload_result = uploader.upload_ebook(filepath, title)
             
@@ -227,29 +419,27 @@ class RPIPollingClient:
                 'action': 'generate_ebook',
                 'file_path': filepath,
                 'cdn_url': upload_result.get('file_url'),
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_timestamp()
             }
             
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_logs(self, params: Dict) -> Dict:
+    def get_logs(self, params: Dict, now_iso: Optional[str] = None) -> Dict:
         """Get system logs"""
         try:
             log_file = params.get('log_file', 'logs/akari_generator_api.log')
             lines = params.get('lines', 50)
             
             if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    log_lines = f.readlines()
-                    recent_logs = log_lines[-lines:] if len(log_lines) > lines else log_lines
+                recent_logs = tail(log_file, lines)
                 
                 return {
                     'success': True,
                     'action': 'get_logs',
                     'log_file': log_file,
                     'logs': recent_logs,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': now_iso or iso_timestamp()
                 }
             else:
                 return {'success': False, 'error': f'Log file not found: {log_file}'}
@@ -257,16 +447,17 @@ class RPIPollingClient:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def restart_service(self) -> Dict:
+    def restart_service(self, now_iso: Optional[str] = None) -> Dict:
         """Restart the API service"""
         try:
-            subprocess.run(['/bin/systemctl', 'restart', 'akari-api.service'], check=True)
+            subprocess.run(['/bin/systemctl', 'restart', 'akari-api.service'], check=True,
+                           timeout=RESTART_TIMEOUT)
             
             return {
                 'success': True,
                 'action': 'restart_service',
                 'message': 'Service restarted successfully',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': now_iso or iso_timestamp()
             }
             
         except Exception as e:
@@ -276,12 +467,11 @@ class RPIPollingClient:
         """Send command execution result back to web server"""
         try:
             response = self.session.post(
-                f"{self.web_server_url}/api/rpi_result.php",
-                json={
+                self._result_url,
+                data=json_bytes({
                     'command_id': command_id,
                     'result': result
-                },
-                headers=self.headers,
+                }),
                 timeout=30
             )
             
@@ -296,50 +486,167 @@ class RPIPollingClient:
             logging.error(f"Error sending command result: {str(e)}")
             return False
     
+    @staticmethod
+    def _open_wake_socket(path: str) -> Optional[socket.socket]:
+        """Bind the wake-up socket, or return None (plain sleeps) if that fails"""
+        try:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            sock.setblocking(False)
+            return sock
+        except OSError as e:
+            logging.warning(f"Wake socket {path} unavailable, using timed polling only: {str(e)}")
+            return None
+    
+    def wait(self, delay: float) -> bool:
+        """Sleep up to delay seconds; True if woken early through the wake socket"""
+        if self.wake_socket is None:
+            time.sleep(delay)
+            return False
+        
+        ready, _, _ = select.select([self.wake_socket], [], [], delay)
+        if not ready:
+            return False
+        
+        # Several wake-ups while busy still mean just one extra poll
+        while True:
+            try:
+                self.wake_socket.recv(64)
+            except BlockingIOError:
+                break
+        logging.info("Woken up for an immediate poll")
+        return True
+    
+    def run_in_background(self, command_id: str, command: Dict):
+        """Execute a long-running command off the polling loop and report it when done"""
+        if command_id in self._inflight:
+            logging.info(f"command_id={command_id} is already queued or running, skipped")
+            return
+        
+        logging.info(f"Queued {command.get('action')} to run in the background")
+        future = self.command_executor.submit(self.execute_command, command)
+        self._inflight[command_id] = future
+        future.add_done_callback(lambda done: self._background_done(command_id, done))
+    
+    def _background_done(self, command_id: str, future: Future):
+        """Report a finished background command"""
+        self._inflight.pop(command_id, None)
+        # execute_command returns errors as results, so result() doesn't raise here
+        self.send_command_result(command_id, future.result())
+    
+    def error_backoff(self) -> float:
+        """Count a failed cycle and return the wait before the next one"""
+        # Exponential backoff with jitter, so a blip costs seconds and many
+        # Pis don't all reconnect at the same moment after an outage
+        self._failures += 1
+        return min(self.poll_interval, 2 ** min(self._failures, 16)) + random.uniform(0, 1)
+    
+    def next_poll_delay(self, had_command: bool) -> float:
+        """Seconds until the next poll: short after a command, then at the quantiles of
+        past command gaps, doubling from poll_interval once those are exhausted"""
+        now = time.monotonic()
+        if had_command:
+            if self.last_command_at is not None:
+                self.command_gaps.append(now - self.last_command_at)
+            self.last_command_at = now
+            self.empty_polls = 0
+            return self.min_poll_interval
+        
+        self.empty_polls += 1
+        if self.long_poll_wait:
+            # The server already waited for a command; reconnect promptly
+            return self.min_poll_interval
+        
+        scheduled = self._scheduled_delay(now)
+        if scheduled is not None:
+            return scheduled
+        return min(self.poll_interval * 2 ** min(self.empty_polls - 1, 16), self.max_poll_interval)
+    
+    def _scheduled_delay(self, now: float) -> Optional[float]:
+        """Delay to the next of polls_per_gap equal-probability points of the gap
+        distribution (up to its 99th percentile), or None without enough history"""
+        if len(self.command_gaps) < 5 or self.last_command_at is None:
+            return None
+        
+        gaps = sorted(self.command_gaps)
+        elapsed = now - self.last_command_at
+        for i in range(1, self.polls_per_gap + 1):
+            point = gaps[round(0.99 * i / self.polls_per_gap * (len(gaps) - 1))]
+            if point > elapsed:
+                return min(max(point - elapsed, self.min_poll_interval), self.max_poll_interval)
+        return None
+    
     def run_polling_loop(self):
         """Main polling loop"""
         logging.info("Starting RPi polling client...")
         
         while True:
             try:
-                # Send status update
-                self.send_status_update()
+                # One timestamp for the status and the quick commands of this cycle
+                now_iso = iso_timestamp()
                 
-                # Check for commands
-                command_data = self.check_for_commands()
+                status_future = None
+                if self.use_heartbeat:
+                    commands = self.heartbeat(now_iso)
+                else:
+                    # Send status update while checking for commands, so one cycle
+                    # costs a single round trip rather than two
+                    status_future = self.status_executor.submit(self.send_status_update, now_iso)
+                    
+                    # Check for commands
+                    commands = self.check_for_commands()
                 
-                if command_data:
+                for command_data in commands:
                     command = command_data.get('command')
                     command_id = command_data.get('command_id')
                     
+                    if (command or {}).get('action') in BACKGROUND_ACTIONS:
+                        self.run_in_background(command_id, command)
+                        continue
+                    
                     # Execute command
-                    result = self.execute_command(command)
+                    result = self.execute_command(command, now_iso)
                     
                     # Send result back
                     self.send_command_result(command_id, result)
                 
+                if status_future is not None:
+                    status_future.result()
+                
+                if self.last_poll_failed:
+                    # The server didn't answer (the poll methods log why): back off
+                    # instead of taking the idle path and re-polling at once
+                    self.wait(self.error_backoff())
+                    continue
+                self._failures = 0
+                
                 # Wait before next poll
-                time.sleep(self.poll_interval)
+                self.wait(self.next_poll_delay(bool(commands)))
                 
             except KeyboardInterrupt:
                 logging.info("Polling client stopped by user")
                 break
             except Exception as e:
                 logging.error(f"Error in polling loop: {str(e)}")
-                time.sleep(self.poll_interval)
+                self.wait(self.error_backoff())
 
 def main():
-    # Load config
-    with open('config/generator_config.json', 'r') as f:
-        config = json.load(f)
-    
     # Create polling client
     client = RPIPollingClient(
         web_server_url="https://shrinepuzzle.com",
         api_key="shrine_admin_key_2024",
-        poll_interval=30  # Poll every 30 seconds
+        poll_interval=30,  # Poll every 30 seconds
+        wake_socket='logs/rpi_polling.sock'  # e.g. `echo | socat - UNIX-SENDTO:logs/rpi_polling.sock`
     )
     
+    # Load config now, so a missing or broken file stops the client at startup;
+    # commands then reuse this parse until the file changes
+    client.load_config()
+    
     # Start polling
     client.run_polling_loop()
 
@@ -5,180 +5,430 @@ Sends status updates and checks for commands from the web server
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
+import contextlib
+import hashlib
 import logging
+import logging.handlers
+import mmap
 import os
+import random
+import shlex
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Deque, Dict, List, Optional, Tuple
 import subprocess
+from collections import deque
+import puzzle_pool
+from rpi_sysinfo import (HAVE_PROC, disk_report, iso_timestamp, json_bytes, json_loads,
+                         json_sorted_bytes, memory_report, pending_commands, status_body,
+                         tail, uptime_report)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/rpi_polling.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging (not in puzzle_pool's workers, which import this script as
+# __mp_main__ and log through the parent)
+if __name__ != '__mp_main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            # Rotated at 1 MB so the log can't grow without bound on the SD card
+            logging.handlers.RotatingFileHandler('logs/rpi_polling.log', maxBytes=1_000_000, backupCount=3,
+                                                 encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+# Status probes: field -> (argv, message when the command isn't available,
+# seconds a result is reused)
+_PROBES = {
+    'uptime': (['uptime'], "uptime command not found", 30),
+    'disk': (['df', '-h', '/'], "df command not found", 300),
+    'memory': (['free', '-h'], "free command not found", 15),
+    'api_status': (['systemctl', 'is-active', 'akari-api.service'], "systemctl command not found", 30),
+}
+# Also searched for the probe binaries: the service's PATH may only hold the venv
+_SYSTEM_BIN_DIRS = ('/usr/bin', '/bin')
+# Marks the end of each probe's output when several run in one shell
+_PROBE_MARKER = '---AKARI---'
+# Seconds each probe may take (systemctl can hang during boot), and a service restart
+PROBE_TIMEOUT = 5
+RESTART_TIMEOUT = 60
+
+# Probes answered from /proc and statvfs where available; systemctl still runs
+_PROC_PROBES = {
+    'uptime': uptime_report,
+    'disk': lambda: disk_report('/'),
+    'memory': memory_report,
+}
+
+@contextlib.contextmanager
+def _map_file(f):
+    """Read-only memoryview of an open file through mmap, so it's sent as one buffer
+    without read() calls or a copy on the Python heap"""
+    if os.fstat(f.fileno()).st_size == 0:
+        # mmap can't map an empty file
+        yield memoryview(b'')
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        yield view
+
+# Most of a command poll response that is read; a command is a few hundred
+# bytes, so anything longer is an error page
+MAX_COMMAND_RESPONSE = 64 * 1024
+
+# Longest wait between polls while the web server is failing (seconds)
+ERROR_BACKOFF_CAP = 60
+
+# An unchanged status is still sent this often (seconds), so the server knows the Pi is alive
+MAX_HEARTBEAT = 300
+# Status fields that change on every update and are left out of the change check
+_VOLATILE_STATUS_FIELDS = ('timestamp', 'uptime')
+
+# Commands that can run for minutes: executed off the polling loop so it keeps
+# sending status and fetching commands meanwhile
+BACKGROUND_ACTIONS = {'generate_puzzles', 'generate_ebook'}
+
+# Where generate_puzzles submits (the puzzle API key, not the admin key)
+PUZZLE_API_URL = "https://shrinepuzzle.com/api/puzzle_receiver.php"
+PUZZLE_API_KEY = "shrine_puzzle_api_key_2024"
 
 class RPIPollingClient:
-    def __init__(self, web_server_url: str, api_key: str, poll_interval: int = 30):
+    def __init__(self, web_server_url: str, api_key: str, poll_interval: int = 30,
+                 min_interval: float = 5, max_interval: float = 120,
+                 backoff_base: float = 1.3, poll_jitter: float = 0.2, use_combined_poll: bool = False,
+                 status_interval: Optional[float] = None, fast_delay: float = 1.0, fast_attempts: int = 5,
+                 gzip_status: bool = False):
         self.web_server_url = web_server_url
         self.api_key = api_key
+        self._status_url = f"{web_server_url}/api/rpi_status.php"
+        self._poll_url = f"{web_server_url}/api/rpi_poll.php"
+        self._cmd_url = f"{web_server_url}/api/rpi_commands.php"
+        self._result_url = f"{web_server_url}/api/rpi_result.php"
+        self._cleanup_url = f"{web_server_url}/api/cleanup_stuck_commands.php"
+        # Fixed for the life of the process
+        self.hostname = os.uname().nodename
+        # Each system binary resolved once, instead of trying paths on every call
+        search_path = os.pathsep.join([os.environ.get('PATH', ''), *_SYSTEM_BIN_DIRS])
+        self.bin = {name: shutil.which(name, path=search_path) or name
+                    for name in ('sh', 'uptime', 'df', 'free', 'systemctl')}
         self.poll_interval = poll_interval
+        # Status goes out from its own thread on this fixed period, so a slow status
+        # POST never holds up command polling
+        self.status_interval = status_interval or poll_interval
+        self._status_thread = None
+        self._stop = threading.Event()
+        
+        # Adaptive polling: re-poll at once after a command, then fast_attempts polls
+        # fast_delay apart (a dashboard session usually queues the next command soon),
+        # then stretch the wait by backoff_base per empty poll (min_interval..max_interval)
+        # spread by +/- poll_jitter; after failed polls wait a random time up to a
+        # doubling ceiling ("full jitter")
+        self.fast_delay = fast_delay
+        self.fast_attempts = fast_attempts
+        self._fast_left = 0
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_base = backoff_base
+        self.poll_jitter = poll_jitter
+        self.consecutive_empty = 0
+        self.consecutive_errors = 0
+        self.last_poll_failed = False
+        
+        # rpi_poll.php takes the status and returns pending commands in one round
+        # trip; without it, the status thread and command polling run independently
+        self.use_combined_poll = use_combined_poll
+        # Gzip large status bodies; only for a server that inflates request bodies
+        # (the PHP endpoints don't on their own)
+        self.gzip_status = gzip_status
+        # BACKGROUND_ACTIONS run one at a time here; their results are sent when they finish
+        self.command_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rpi-cmd')
+        # Background commands queued or running, by command_id, so one the server
+        # hands out again before it has a result isn't run twice
+        self._inflight: Dict[str, Future] = {}
+        # Generators built on first use and kept warm between commands: name -> (config key, client)
+        self._clients = {}
+        
+        # Probe results as field -> (value, monotonic expiry), and the last log tail
+        # keyed by the file's (mtime, size)
+        self._status_cache = {}
+        self._log_cache = (None, [])
+        # get_logs state per log file: (inode, bytes read so far, ring of the last lines)
+        self._log_offsets: Dict[str, Tuple[int, int, Deque[str]]] = {}
+        # Both caches are shared by the status thread and combined polls
+        self._status_lock = threading.Lock()
+        # ETag of the last command poll response, sent back as If-None-Match
+        self._commands_etag = None
+        # Hash of the last status the server accepted, and when it was sent (monotonic)
+        self._last_status_hash = None
+        self._last_status_sent = 0.0
         self.session = requests.Session()
+        # Transient gateway errors and dropped connections are retried on a kept-alive
+        # socket with backoff (1.3s, 2.6s, 5.2s) before a status or result is given up
+        retries = Retry(total=3, backoff_factor=1.3, status_forcelist=[502, 503, 504],
+                        allowed_methods=frozenset(['GET', 'POST', 'PUT']), raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=8)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Separate keep-alive pool for storage.bunnycdn.com, so consecutive ebook
+        # uploads skip the TCP and TLS handshake
+        self.cdn_session = requests.Session()
+        self.cdn_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
         
         # Headers for all requests
         self.headers = {
             'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive'
         }
+        # Sent with every request on the session, so calls don't pass them each time
+        self.session.headers.update(self.headers)
+    
+    def _probe_argv(self, field: str) -> List[str]:
+        """A probe's argv with the binary's resolved path"""
+        argv = _PROBES[field][0]
+        return [self.bin[argv[0]], *argv[1:]]
+    
+    def _probe_batched(self, fields: List[str]) -> List[str]:
+        """Output of the given probes from a single shell invocation"""
+        script = f"; echo {_PROBE_MARKER}; ".join(shlex.join(self._probe_argv(field)) for field in fields)
+        result = subprocess.run([self.bin['sh'], '-c', script], capture_output=True, text=True,
+                                timeout=PROBE_TIMEOUT * len(fields))
+        sections = [[]]
+        for line in result.stdout.splitlines():
+            if line == _PROBE_MARKER:
+                sections.append([])
+            else:
+                sections[-1].append(line)
+        if len(sections) != len(fields):
+            raise RuntimeError(f"unexpected probe output: {len(sections)} sections for {len(fields)} probes")
+        
+        # A probe that printed nothing (e.g. not installed) reports as missing
+        return ['\n'.join(section).strip() or _PROBES[field][1]
+                for section, field in zip(sections, fields)]
     
-    def get_system_status(self) -> Dict:
-        """Get current system status"""
+    def _probe_individually(self, field: str) -> str:
+        """Output of one probe in its own process"""
         try:
-            # Get uptime - try multiple possible paths
-            uptime = None
-            uptime_paths = ['/usr/bin/uptime', '/bin/uptime', 'uptime']
-            for path in uptime_paths:
-                try:
-                    uptime = subprocess.check_output([path]).decode().strip()
-                    break
-                except (FileNotFoundError, subprocess.CalledProcessError):
-                    continue
-            
-            if not uptime:
-                uptime = "uptime command not found"
-            
-            # Get disk usage - try multiple possible paths
-            disk = None
-            df_paths = ['/bin/df', '/usr/bin/df', 'df']
-            for path in df_paths:
-                try:
-                    disk = subprocess.check_output([path, '-h', '/']).decode().strip()
-                    break
-                except (FileNotFoundError, subprocess.CalledProcessError):
-                    continue
-            
-            if not disk:
-                disk = "df command not found"
-            
-            # Get memory usage - try multiple possible paths
-            memory = None
-            free_paths = ['/usr/bin/free', '/bin/free', 'free']
-            for path in free_paths:
-                try:
-                    memory = subprocess.check_output([path, '-h']).decode().strip()
-                    break
-                except (FileNotFoundError, subprocess.CalledProcessError):
-                    continue
-            
-            if not memory:
-                memory = "free command not found"
-            
-            # Check service status - try multiple possible paths
-            api_status = None
-            systemctl_paths = ['/bin/systemctl', '/usr/bin/systemctl', 'systemctl']
-            for path in systemctl_paths:
+            output = subprocess.run(self._probe_argv(field), capture_output=True, text=True,
+                                    timeout=PROBE_TIMEOUT, check=True).stdout.strip()
+        except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            output = ''
+        return output or _PROBES[field][1]
+    
+    def _probe_status(self) -> Dict[str, str]:
+        """Probe results, re-running only those older than their cache time"""
+        now = time.monotonic()
+        stale = [field for field in _PROBES if self._status_cache.get(field, (None, 0))[1] <= now]
+        if HAVE_PROC:
+            for field in [field for field in stale if field in _PROC_PROBES]:
                 try:
-                    api_status = subprocess.check_output([path, 'is-active', 'akari-api.service']).decode().strip()
-                    break
-                except (FileNotFoundError, subprocess.CalledProcessError):
-                    continue
-            
-            if not api_status:
-                api_status = "systemctl command not found"
-            
-            # Get recent log entries
-            log_file = 'logs/akari_generator_api.log'
-            recent_logs = []
-            if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    lines = f.readlines()
-                    recent_logs = lines[-10:]  # Last 10 lines
+                    self._status_cache[field] = (_PROC_PROBES[field]().strip(), now + _PROBES[field][2])
+                    stale.remove(field)
+                except (OSError, ValueError) as proc_error:
+                    logging.warning(f"Reading {field} from /proc failed, running the command: {str(proc_error)}")
+        if stale:
+            # One shell runs every stale probe; fall back to one process each
+            try:
+                values = self._probe_batched(stale)
+            except Exception as probe_error:
+                logging.warning(f"Batched status probe failed, probing individually: {str(probe_error)}")
+                values = [self._probe_individually(field) for field in stale]
+            for field, value in zip(stale, values):
+                self._status_cache[field] = (value, now + _PROBES[field][2])
+        return {field: cached[0] for field, cached in self._status_cache.items()}
+    
+    def _recent_logs(self, log_file: str) -> List[str]:
+        """Last 10 lines of log_file, re-read only when the file has changed"""
+        try:
+            st = os.stat(log_file)
+        except FileNotFoundError:
+            return []
+        
+        key = (st.st_mtime_ns, st.st_size)
+        if self._log_cache[0] != key:
+            self._log_cache = (key, tail(log_file, 10))  # Last 10 lines
+        return self._log_cache[1]
+    
+    def get_system_status(self, now_iso: Optional[str] = None) -> Dict:
+        """Get current system status (now_iso: this poll cycle's timestamp)"""
+        timestamp = now_iso or iso_timestamp()
+        try:
+            with self._status_lock:
+                probes = self._probe_status()
+                
+                # Get recent log entries
+                recent_logs = self._recent_logs('logs/akari_generator_api.log')
             
             return {
-                'timestamp': datetime.now().isoformat(),
-                'hostname': os.uname().nodename,
-                'uptime': uptime,
-                'disk_usage': disk,
-                'memory_usage': memory,
-                'api_service_status': api_status,
+                'timestamp': timestamp,
+                'hostname': self.hostname,
+                'uptime': probes['uptime'],
+                'disk_usage': probes['disk'],
+                'memory_usage': probes['memory'],
+                'api_service_status': probes['api_status'],
                 'recent_logs': recent_logs,
                 'online': True
             }
         except Exception as e:
             logging.error(f"Error getting system status: {str(e)}")
             return {
-                'timestamp': datetime.now().isoformat(),
-                'hostname': os.uname().nodename,
+                'timestamp': timestamp,
+                'hostname': self.hostname,
                 'online': True,
                 'error': str(e)
             }
     
-    def send_status_update(self) -> bool:
+    def send_status_update(self, now_iso: Optional[str] = None) -> bool:
         """Send status update to web server"""
         try:
-            status = self.get_system_status()
+            status = self.get_system_status(now_iso)
+            stable = {key: value for key, value in status.items() if key not in _VOLATILE_STATUS_FIELDS}
+            digest = hashlib.blake2b(json_sorted_bytes(stable), digest_size=16).digest()
+            if (digest == self._last_status_hash and
+                    time.monotonic() - self._last_status_sent < MAX_HEARTBEAT):
+                logging.info("Status unchanged, update skipped")
+                return True
             
+            body, headers = status_body({'status': status}, self.gzip_status)
             response = self.session.post(
-                f"{self.web_server_url}/api/rpi_status.php",
-                json={'status': status},
-                headers=self.headers,
+                self._status_url,
+                data=body,
+                headers=headers,
                 timeout=30
             )
             
             if response.status_code == 200:
+                self._last_status_hash = digest
+                self._last_status_sent = time.monotonic()
                 logging.info("Status update sent successfully")
                 return True
             else:
                 logging.error(f"Status update failed: HTTP {response.status_code}")
-                logging.error(f"Response: {response.text}")
+                logging.error(f"Response: {response.text[:500]}")
                 return False
                 
         except Exception as e:
             logging.error(f"Error sending status update: {str(e)}")
             return False
     
-    def check_for_commands(self) -> Optional[Dict]:
-        """Check for commands from web server"""
+    def check_for_commands(self) -> List[Dict]:
+        """Check for commands from web server (every queued one, if the server sends them all)"""
+        self.last_poll_failed = True
         try:
-            hostname = os.uname().nodename
+            hostname = self.hostname
             # Use params to avoid subtle URL formatting/caching issues and improve observability
             logging.info(f"Checking for commands (hostname={hostname})")
-            response = self.session.get(
-                f"{self.web_server_url}/api/rpi_commands.php",
-                headers=self.headers,
-                params={"hostname": hostname, "_t": int(time.time())},
-                timeout=30
-            )
-            
-            if response.status_code == 200:
+            # Conditional request: an unchanged command queue comes back as an empty 304.
+            # no-cache makes any cache on the way revalidate rather than answer itself
+            headers = {'Cache-Control': 'no-cache'}
+            if self._commands_etag:
+                headers['If-None-Match'] = self._commands_etag
+            # Streamed so at most MAX_COMMAND_RESPONSE bytes of the body are ever read
+            with self.session.get(
+                self._cmd_url,
+                headers=headers,
+                params={"hostname": hostname},
+                timeout=30,
+                stream=True
+            ) as response:
+                status_code = response.status_code
+                raw = response.raw.read(MAX_COMMAND_RESPONSE, decode_content=True) if status_code == 200 else b''
+                etag = response.headers.get('ETag')
+            
+            if status_code == 304:
+                self.last_poll_failed = False
+                logging.info("No commands available (not modified)")
+                return []
+            if status_code == 200:
+                self._commands_etag = etag
                 try:
-                    data = response.json()
+                    data = json_loads(raw)
                 except Exception as json_error:
-                    logging.error(f"Failed to parse command response JSON: {str(json_error)} | Body: {response.text[:500]}")
-                    return None
+                    body = raw[:500].decode('utf-8', 'replace')
+                    logging.error(f"Failed to parse command response JSON: {str(json_error)} | Body: {body}")
+                    return []
 
-                has_commands = bool(data.get('data', {}).get('has_commands'))
-                if has_commands:
-                    logging.info(f"Received command: {data.get('data', {}).get('command')}")
-                    return data.get('data')
+                self.last_poll_failed = False
+                commands = pending_commands(data.get('data') or {})
+                if commands:
+                    for command_data in commands:
+                        logging.info(f"Received command: {command_data.get('command')}")
                 else:
                     logging.info("No commands available")
-                    return None
+                return commands
             else:
-                logging.error(f"Command check failed: HTTP {response.status_code}")
-                return None
+                logging.error(f"Command check failed: HTTP {status_code}")
+                return []
                 
         except Exception as e:
             logging.error(f"Error checking for commands: {str(e)}")
-            return None
+            return []
+    
+    def poll(self, now_iso: Optional[str] = None) -> List[Dict]:
+        """Fetch pending commands, sending the status along where the server allows"""
+        if self.use_combined_poll:
+            commands = self.combined_poll(now_iso)
+            if commands is not None:
+                return commands
+        
+        # Status is the status thread's job from here on
+        self.start_status_thread()
+        logging.info("Polling for commands...")
+        return self.check_for_commands()
+    
+    def start_status_thread(self):
+        """Start the periodic status thread unless it's already running"""
+        if self._status_thread is None:
+            self._status_thread = threading.Thread(target=self._status_loop, name='rpi-status', daemon=True)
+            self._status_thread.start()
+    
+    def _status_loop(self):
+        """Send a status update every status_interval seconds until stopped"""
+        while not self._stop.is_set():
+            self.send_status_update()
+            self._stop.wait(self.status_interval)
+    
+    def combined_poll(self, now_iso: Optional[str] = None) -> Optional[List[Dict]]:
+        """POST status to rpi_poll.php and return its commands; None if it's unavailable"""
+        self.last_poll_failed = True
+        try:
+            hostname = self.hostname
+            body, headers = status_body({'status': self.get_system_status(now_iso), 'hostname': hostname},
+                                         self.gzip_status)
+            response = self.session.post(
+                self._poll_url,
+                data=body,
+                headers=headers,
+                timeout=30
+            )
+            
+            if response.status_code == 404:
+                logging.warning("Combined poll endpoint not found, using separate status and command requests")
+                self.use_combined_poll = False
+                return None
+            if response.status_code != 200:
+                logging.error(f"Combined poll failed: HTTP {response.status_code}")
+                return []
+            
+            commands = json_loads(response.content).get('commands') or []
+            self.last_poll_failed = False
+            if commands:
+                logging.info(f"Received {len(commands)} command(s)")
+            else:
+                logging.info("No commands available")
+            return commands
+            
+        except Exception as e:
+            logging.error(f"Error in combined poll: {str(e)}")
+            return []
     
-    def execute_command(self, command: Dict) -> Dict:
-        """Execute a command and return results"""
+    def execute_command(self, command: Dict, now_iso: Optional[str] = None) -> Dict:
+        """Execute a command and return results (quick actions stamp them with now_iso)"""
         try:
             action = command.get('action')
             params = command.get('params', {})
@@ -188,11 +438,11 @@ class RPIPollingClient:
             elif action == 'generate_ebook':
                 return self.generate_ebook(params)
             elif action == 'get_logs':
-                return self.get_logs(params)
+                return self.get_logs(params, now_iso)
             elif action == 'restart_service':
-                return self.restart_service()
+                return self.restart_service(now_iso)
             elif action == 'cleanup_stuck_commands':
-                return self.cleanup_stuck_commands(params)
+                return self.cleanup_stuck_commands(params, now_iso)
             else:
                 return {'success': False, 'error': f'Unknown action: {action}'}
                 
@@ -200,16 +450,31 @@ class RPIPollingClient:
             logging.error(f"Error executing command: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def _shared_client(self, name: str, key, factory):
+        """Client cached under name, rebuilt when key (its config) changes"""
+        cached = self._clients.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, factory())
+            self._clients[name] = cached
+        return cached[1]
+    
+    def _get_puzzle_generator(self, api_url: str, api_key: str):
+        def factory():
+            from akari_generator_api import AkariPuzzleGeneratorAPI
+            return AkariPuzzleGeneratorAPI(api_url, api_key)
+        return self._shared_client('puzzle_generator', (api_url, api_key), factory)
+    
+    def _get_ebook_generator(self, config: Dict):
+        def factory():
+            from enhanced_html_ebook_generator import EnhancedHTMLEbookGenerator
+            return EnhancedHTMLEbookGenerator(config)
+        return self._shared_client('ebook_generator', json.dumps(config, sort_keys=True), factory)
+    
     def generate_puzzles(self, params: Dict) -> Dict:
         """Generate puzzles"""
         try:
-            from akari_generator_api import AkariPuzzleGeneratorAPI
-            
             # Use the correct API key for puzzle submission
-            generator = AkariPuzzleGeneratorAPI(
-                "https://shrinepuzzle.com/api/puzzle_receiver.php",
-                "shrine_puzzle_api_key_2024"  # Use the puzzle API key
-            )
+            generator = self._get_puzzle_generator(PUZZLE_API_URL, PUZZLE_API_KEY)
             
             # Ensure proper data types
             sizes_raw = params.get('sizes', [6, 8])
@@ -231,18 +496,14 @@ class RPIPollingClient:
             count = int(params.get('count', 5))  # Ensure count is an integer
             mode = params.get('mode', 'premium')
             
-            result = generator.generate_batch(
-                sizes=sizes,
-                difficulties=difficulties,
-                count_per_size=count,
-                mode=mode
-            )
+            # CPU-bound: generated on the shared process pool, one process per core
+            result = puzzle_pool.generate_batch(generator, sizes, difficulties, count, mode)
             
             return {
                 'success': True,
                 'action': 'generate_puzzles',
                 'result': result,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': iso_timestamp()
             }
             
         except Exception as e:
@@ -251,14 +512,12 @@ class RPIPollingClient:
     def generate_ebook(self, params: Dict) -> Dict:
         """Generate HTML ebook with zen-like design"""
         try:
-            from enhanced_html_ebook_generator import EnhancedHTMLEbookGenerator
-            
             # Configuration for HTML ebook generation
             config = {
                 'api_url': 'https://shrinepuzzle.com/api/puzzle_receiver.php',
                 'api_key': 'shrine_puzzle_api_key_2024',
                 'output_dir': './generated_ebooks',
-                'log_file': './html_ebook_generation.log',
+                'log_file': './logs/html_ebook_generation.log',
                 'cdn_bunny': {
                     'storage_zone': 'shrinepuzzle-ebooks',
                     'api_key': 'your_cdn_bunny_api_key_here',  # Update with actual key
@@ -266,8 +525,8 @@ class RPIPollingClient:
                 }
             }
             
-            # Initialize HTML ebook generator
-            generator = EnhancedHTMLEbookGenerator(config)
+            # HTML ebook generator, reused across ebook commands
+            generator = self._get_ebook_generator(config)
             
             # Extract parameters
             title = params.get('title', 'Akari Puzzle Collection')
@@ -279,13 +538,11 @@ class RPIPollingClient:
             os.makedirs(config['output_dir'], exist_ok=True)
             
             # Generate puzzles first
-            from akari_generator_api import AkariPuzzleGeneratorAPI
-            puzzle_gen = AkariPuzzleGeneratorAPI(config['api_url'], config['api_key'])
-            puzzles = puzzle_gen.generate_ebook_puzzles(sizes, count)
-            
-            # Filter puzzles by difficulty if specified
-            if difficulties:
-                puzzles = [p for p in puzzles if p.get('difficulty') in difficulties]
+            puzzle_gen = self._get_puzzle_generator(config['api_url'], config['api_key'])
+            # Only the requested difficulties are generated (deduplicated, order kept; all if none given)
+            puzzles = puzzle_gen.generate_ebook_puzzles(
+                sizes, count, difficulties=list(dict.fromkeys(difficulties)) if difficulties else None
+            )
             
             if not puzzles:
                 return {'success': False, 'error': 'No puzzles generated with specified parameters'}
@@ -305,58 +562,44 @@ class RPIPollingClient:
                 include_print_button=True
             )
             
-            # Upload to CDN Bunny
-            try:
-                cdn_result = self.upload_to_cdn_bunny(output_file, title, config['cdn_bunny'])
+            # One read-only mapping serves both the file size and the upload body
+            with open(output_file, 'rb') as f, _map_file(f) as body:
+                file_size = len(body)
                 
-                if cdn_result['success']:
-                    return {
-                        'success': True,
-                        'action': 'generate_html_ebook',
-                        'result': {
-                            'file_path': output_file,
-                            'cdn_url': cdn_result['cdn_url'],
-                            'puzzle_count': len(puzzles),
-                            'file_size': os.path.getsize(output_file) if os.path.exists(output_file) else 0
-                        },
-                        'timestamp': datetime.now().isoformat()
-                    }
-                else:
-                    return {
-                        'success': True,
-                        'action': 'generate_html_ebook',
-                        'result': {
-                            'file_path': output_file,
-                            'cdn_url': None,
-                            'cdn_error': cdn_result['error'],
-                            'puzzle_count': len(puzzles),
-                            'file_size': os.path.getsize(output_file) if os.path.exists(output_file) else 0
-                        },
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    
-            except Exception as cdn_error:
-                return {
-                    'success': True,
-                    'action': 'generate_html_ebook',
-                    'result': {
-                        'file_path': output_file,
-                        'cdn_url': None,
-                        'cdn_error': str(cdn_error),
-                        'puzzle_count': len(puzzles),
-                        'file_size': os.path.getsize(output_file) if os.path.exists(output_file) else 0
-                    },
-                    'timestamp': datetime.now().isoformat()
-                }
+                # Upload to CDN Bunny
+                try:
+                    cdn_result = self.upload_to_cdn_bunny(output_file, title, config['cdn_bunny'], body)
+                except Exception as cdn_error:
+                    cdn_result = {'success': False, 'error': str(cdn_error)}
+            
+            result = {
+                'file_path': output_file,
+                'cdn_url': cdn_result.get('cdn_url'),
+                'puzzle_count': len(puzzles),
+                'file_size': file_size
+            }
+            if not cdn_result['success']:
+                result['cdn_error'] = cdn_result['error']
+            
+            return {
+                'success': True,
+                'action': 'generate_html_ebook',
+                'result': result,
+                'timestamp': iso_timestamp()
+            }
                 
         except Exception as e:
             logging.error(f"Error generating HTML ebook: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def upload_to_cdn_bunny(self, file_path: str, title: str, cdn_config: Dict) -> Dict:
-        """Upload file to CDN Bunny"""
+    def upload_to_cdn_bunny(self, file_path: str, title: str, cdn_config: Dict,
+                            body: Optional[memoryview] = None) -> Dict:
+        """Upload file to CDN Bunny (body: the file's contents, if already mapped)"""
         try:
-            import requests
+            if body is None:
+                with open(file_path, 'rb') as f, _map_file(f) as mapped:
+                    return self.upload_to_cdn_bunny(file_path, title, cdn_config, mapped)
+            
             from pathlib import Path
             
             filename = Path(file_path).name
@@ -364,29 +607,29 @@ class RPIPollingClient:
             
             url = f"https://storage.bunnycdn.com/{cdn_config['storage_zone']}/{cdn_filename}"
             
-            with open(file_path, 'rb') as f:
-                headers = {
-                    'AccessKey': cdn_config['api_key'],
-                    'Content-Type': 'text/html'
+            headers = {
+                'AccessKey': cdn_config['api_key'],
+                'Content-Type': 'text/html',
+                'Content-Length': str(len(body))
+            }
+            
+            response = self.cdn_session.put(url, data=body, headers=headers, timeout=60)
+            
+            if response.status_code == 201:
+                cdn_url = f"{cdn_config['pull_zone']}/{cdn_filename}"
+                logging.info(f"CDN upload successful: {cdn_url}")
+                return {
+                    'success': True,
+                    'cdn_url': cdn_url,
+                    'filename': cdn_filename
+                }
+            else:
+                error_msg = f"Upload failed: HTTP {response.status_code}"
+                logging.error(f"CDN upload failed: {error_msg}")
+                return {
+                    'success': False,
+                    'error': error_msg
                 }
-                
-                response = requests.put(url, data=f, headers=headers, timeout=60)
-                
-                if response.status_code == 201:
-                    cdn_url = f"{cdn_config['pull_zone']}/{cdn_filename}"
-                    logging.info(f"CDN upload successful: {cdn_url}")
-                    return {
-                        'success': True,
-                        'cdn_url': cdn_url,
-                        'filename': cdn_filename
-                    }
-                else:
-                    error_msg = f"Upload failed: HTTP {response.status_code}"
-                    logging.error(f"CDN upload failed: {error_msg}")
-                    return {
-                        'success': False,
-                        'error': error_msg
-                    }
                     
         except Exception as e:
             error_msg = f"CDN upload error: {str(e)}"
@@ -395,50 +638,22 @@ class RPIPollingClient:
                 'success': False,
                 'error': error_msg
             }
-                
-                upload_result = uploader.upload_ebook(filepath, title)
-                
-                return {
-                    'success': True,
-                    'action': 'generate_ebook',
-                    'file_path': filepath,
-                    'puzzles_generated': len(puzzles),
-                    'cdn_url': upload_result.get('file_url'),
-                    'cdn_upload_success': upload_result.get('success', False),
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-            except Exception as cdn_error:
-                # If CDN upload fails, still return success for local file
-                return {
-                    'success': True,
-                    'action': 'generate_ebook',
-                    'file_path': filepath,
-                    'puzzles_generated': len(puzzles),
-                    'cdn_error': str(cdn_error),
-                    'timestamp': datetime.now().isoformat()
-                }
-            
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
     
-    def get_logs(self, params: Dict) -> Dict:
+    def get_logs(self, params: Dict, now_iso: Optional[str] = None) -> Dict:
         """Get system logs"""
         try:
             log_file = params.get('log_file', 'logs/akari_generator_api.log')
             lines = params.get('lines', 50)
             
             if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    log_lines = f.readlines()
-                    recent_logs = log_lines[-lines:] if len(log_lines) > lines else log_lines
+                recent_logs = self._follow_log(log_file, lines)
                 
                 return {
                     'success': True,
                     'action': 'get_logs',
                     'log_file': log_file,
                     'logs': recent_logs,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': now_iso or iso_timestamp()
                 }
             else:
                 return {'success': False, 'error': f'Log file not found: {log_file}'}
@@ -446,52 +661,70 @@ class RPIPollingClient:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def restart_service(self) -> Dict:
+    def _follow_log(self, log_file: str, lines: int) -> List[str]:
+        """Last lines of log_file, reading only what was appended since the previous call"""
+        st = os.stat(log_file)
+        inode, offset, ring = self._log_offsets.get(log_file, (None, 0, None))
+        
+        if ring is None or inode != st.st_ino or st.st_size < offset or (ring.maxlen or 0) < lines:
+            # First call, rotated or truncated file, or more lines wanted than kept
+            ring = deque(tail(log_file, lines), maxlen=max(lines, 0))
+        elif st.st_size > offset:
+            with open(log_file, 'rb') as f:
+                f.seek(offset)
+                text = f.read(st.st_size - offset).decode('utf-8', errors='replace')
+            if ring and not ring[-1].endswith('\n'):
+                # The last line was still being written when it was read
+                text = ring.pop() + text
+            ring.extend(text.splitlines(keepends=True))
+        
+        self._log_offsets[log_file] = (st.st_ino, st.st_size, ring)
+        return list(ring)[-lines:] if lines > 0 else []
+    
+    def restart_service(self, now_iso: Optional[str] = None) -> Dict:
         """Restart the API service"""
         try:
-            # Try multiple systemctl paths
-            systemctl_paths = ['/bin/systemctl', '/usr/bin/systemctl', 'systemctl']
-            for path in systemctl_paths:
-                try:
-                    subprocess.run([path, 'restart', 'akari-api.service'], check=True)
-                    return {
-                        'success': True,
-                        'action': 'restart_service',
-                        'message': 'Service restarted successfully',
-                        'timestamp': datetime.now().isoformat()
-                    }
-                except (FileNotFoundError, subprocess.CalledProcessError):
-                    continue
+            subprocess.run([self.bin['systemctl'], 'restart', 'akari-api.service'], check=True,
+                           timeout=RESTART_TIMEOUT)
+            return {
+                'success': True,
+                'action': 'restart_service',
+                'message': 'Service restarted successfully',
+                'timestamp': now_iso or iso_timestamp()
+            }
             
+        except FileNotFoundError:
             return {'success': False, 'error': 'systemctl command not found'}
-            
+        except subprocess.CalledProcessError as e:
+            return {'success': False, 'error': f'systemctl restart failed with exit code {e.returncode}'}
+        except subprocess.TimeoutExpired:
+            return {'success': False, 'error': f'systemctl restart timed out after {RESTART_TIMEOUT}s'}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def cleanup_stuck_commands(self, params: Dict) -> Dict:
+    def cleanup_stuck_commands(self, params: Dict, now_iso: Optional[str] = None) -> Dict:
         """Clean up stuck commands by calling the web server API"""
         try:
             older_than_minutes = params.get('older_than_minutes', 30)
             
             response = self.session.post(
-                f"{self.web_server_url}/api/cleanup_stuck_commands.php",
-                headers=self.headers,
+                self._cleanup_url,
                 timeout=30
             )
             
             if response.status_code == 200:
-                result = response.json()
+                result = json_loads(response.content)
                 return {
                     'success': True,
                     'action': 'cleanup_stuck_commands',
                     'result': result,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': now_iso or iso_timestamp()
                 }
             else:
                 return {
                     'success': False,
                     'error': f'Cleanup failed: HTTP {response.status_code}',
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': now_iso or iso_timestamp()
                 }
                 
         except Exception as e:
@@ -501,12 +734,11 @@ class RPIPollingClient:
         """Send command execution result back to web server"""
         try:
             response = self.session.post(
-                f"{self.web_server_url}/api/rpi_result.php",
-                json={
+                self._result_url,
+                data=json_bytes({
                     'command_id': command_id,
                     'result': result
-                },
-                headers=self.headers,
+                }),
                 timeout=30
             )
             
@@ -521,43 +753,98 @@ class RPIPollingClient:
             logging.error(f"Error sending command result: {str(e)}")
             return False
     
+    def report_result(self, command_id: str, result: Dict):
+        """Send a command's result back and log the outcome"""
+        if self.send_command_result(command_id, result):
+            logging.info(f"Result sent for command_id={command_id}")
+        else:
+            logging.error(f"Failed to send result for command_id={command_id}")
+    
+    def run_in_background(self, command_id: str, command: Dict):
+        """Execute a long-running command off the polling loop and report it when done"""
+        if command_id in self._inflight:
+            logging.info(f"command_id={command_id} is already queued or running, skipped")
+            return
+        
+        logging.info(f"Queued command_id={command_id} action={command.get('action')} to run in the background")
+        future = self.command_executor.submit(self.execute_command, command)
+        self._inflight[command_id] = future
+        future.add_done_callback(lambda done: self._background_done(command_id, done))
+    
+    def _background_done(self, command_id: str, future: Future):
+        """Report a finished background command"""
+        self._inflight.pop(command_id, None)
+        # execute_command returns errors as results, so result() doesn't raise here
+        self.report_result(command_id, future.result())
+    
+    def next_poll_delay(self, had_command: bool) -> float:
+        """Seconds to wait before the next poll, from the outcome of this one"""
+        if had_command:
+            # More commands may be queued behind this one
+            self.consecutive_empty = 0
+            self.consecutive_errors = 0
+            self._fast_left = self.fast_attempts
+            return 0
+        
+        if self.last_poll_failed:
+            self.consecutive_errors += 1
+            return self._next_backoff(self.consecutive_errors)
+        
+        self.consecutive_errors = 0
+        if self._fast_left > 0:
+            self._fast_left -= 1
+            return self.fast_delay
+        self.consecutive_empty += 1
+        delay = min(self.max_interval, self.min_interval * self.backoff_base ** min(self.consecutive_empty, 64))
+        
+        # Jitter keeps a fleet of Pis from polling in lockstep
+        return max(0.0, delay + random.uniform(-self.poll_jitter, self.poll_jitter) * delay)
+    
+    def _next_backoff(self, attempt: int) -> float:
+        """Full-jitter backoff: anywhere from 0 to min_interval * 2^attempt, capped at
+        ERROR_BACKOFF_CAP, so Pis that failed together don't retry together"""
+        return random.uniform(0, min(ERROR_BACKOFF_CAP, self.min_interval * 2 ** min(attempt, 16)))
+    
     def run_polling_loop(self):
         """Main polling loop"""
         logging.info("Starting RPi polling client...")
         
         while True:
             try:
-                # Send status update
-                self.send_status_update()
+                # One timestamp per cycle; only the long-running generate actions
+                # stamp their results afresh
+                now_iso = iso_timestamp()
                 
-                # Check for commands
-                logging.info("Polling for commands...")
-                command_data = self.check_for_commands()
+                # Send status update and check for commands
+                commands = self.poll(now_iso)
                 
-                if command_data:
+                for command_data in commands:
                     command = command_data.get('command')
                     command_id = command_data.get('command_id')
                     
+                    if command.get('action') in BACKGROUND_ACTIONS:
+                        self.run_in_background(command_id, command)
+                        continue
+                    
                     # Execute command
                     logging.info(f"Executing command_id={command_id} action={command.get('action')}")
-                    result = self.execute_command(command)
+                    result = self.execute_command(command, now_iso)
                     
                     # Send result back
-                    sent_ok = self.send_command_result(command_id, result)
-                    if not sent_ok:
-                        logging.error(f"Failed to send result for command_id={command_id}")
-                    else:
-                        logging.info(f"Result sent for command_id={command_id}")
+                    self.report_result(command_id, result)
                 
                 # Wait before next poll
-                time.sleep(self.poll_interval)
+                delay = self.next_poll_delay(bool(commands))
+                if delay > 0:
+                    time.sleep(delay)
                 
             except KeyboardInterrupt:
                 logging.info("Polling client stopped by user")
+                self._stop.set()
                 break
             except Exception as e:
                 logging.error(f"Error in polling loop: {str(e)}")
-                time.sleep(self.poll_interval)
+                time.sleep(self.poll_interval + random.uniform(0, self.poll_interval * 0.2))
 
 def main():
     # Simple config without external file dependency
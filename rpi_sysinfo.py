@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Shared RPi helpers
+System status reports, timestamps and the status/command wire format used by
+the RPi API server and both polling clients
+"""
+
+import gzip
+import json
+import math
+import os
+import shutil
+import subprocess
+import time
+from typing import Dict, List, Tuple
+
+# orjson serializes straight to bytes in C; fall back to the stdlib when it isn't installed
+try:
+    import orjson
+    
+    def json_bytes(data) -> bytes:
+        # Command results can have int keys (generate_batch's by_size); json.dumps
+        # turns them into strings, orjson needs telling to
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    
+    def json_sorted_bytes(data) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    
+    json_loads = orjson.loads
+except ImportError:
+    def json_bytes(data) -> bytes:
+        return json.dumps(data).encode()
+    
+    def json_sorted_bytes(data) -> bytes:
+        return json.dumps(data, sort_keys=True).encode()
+    
+    json_loads = json.loads
+
+# With compression on, status bodies larger than this (mostly recent_logs) are sent gzipped
+GZIP_MIN_BYTES = 1024
+
+def status_body(payload, compress: bool = False) -> Tuple[bytes, Dict[str, str]]:
+    """JSON body for a status POST and its extra headers; with compress, gzipped
+    (level 1) over GZIP_MIN_BYTES"""
+    raw = json_bytes(payload)
+    if not compress or len(raw) <= GZIP_MIN_BYTES:
+        return raw, {}
+    return gzip.compress(raw, compresslevel=1), {'Content-Encoding': 'gzip'}
+
+def iso_timestamp() -> str:
+    """Local time in datetime.isoformat() form (always with microseconds) from one clock
+    read and C-level strftime, without building a datetime"""
+    now = time.time()
+    return '%s.%06d' % (time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now)), int(now % 1 * 1_000_000))
+
+def pending_commands(payload: Dict) -> List[Dict]:
+    """Commands in a poll response: the whole queue when the server sends a commands
+    list of {command_id, command} entries, otherwise the single command"""
+    if not payload.get('has_commands'):
+        return []
+    batch = [entry for entry in payload.get('commands') or []
+             if isinstance(entry, dict) and isinstance(entry.get('command'), dict)]
+    return batch or [payload]
+
+# System status without forking df/free/uptime; output mimics those tools
+def human_size(num: float, suffix: str = '') -> str:
+    """Format a byte count the way df -h / free -h do"""
+    unit = ''
+    for unit in ('B', 'K', 'M', 'G', 'T', 'P'):
+        if num < 1024:
+            break
+        num /= 1024
+    if unit == 'B':
+        return f"{int(num)}B"
+    # Like df, round up rather than to nearest
+    if num < 10:
+        return f"{math.ceil(num * 10) / 10:.1f}{unit}{suffix}"
+    return f"{math.ceil(num)}{unit}{suffix}"
+
+def disk_report(path: str) -> str:
+    """Equivalent of `df -h path`"""
+    st = os.statvfs(path)
+    size = st.f_blocks * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    avail = st.f_bavail * st.f_frsize
+    pct = -(-used * 100 // (used + avail)) if used + avail else 0
+    
+    device = path
+    try:
+        with open('/proc/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 1 and fields[1] == path:
+                    device = fields[0]
+    except OSError:
+        pass
+    
+    return (
+        f"{'Filesystem':<15}{'Size':>5} {'Used':>5} {'Avail':>5} {'Use%':>4} Mounted on\n"
+        f"{device:<15}{human_size(size):>5} {human_size(used):>5} {human_size(avail):>5} {pct:>3}% {path}\n"
+    )
+
+def memory_report() -> str:
+    """Equivalent of `free -h`, from /proc/meminfo"""
+    info = {}
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            info[key] = int(value.split()[0]) * 1024
+    
+    total = info.get('MemTotal', 0)
+    free = info.get('MemFree', 0)
+    available = info.get('MemAvailable', free)
+    cache = info.get('Buffers', 0) + info.get('Cached', 0) + info.get('SReclaimable', 0)
+    swap_total = info.get('SwapTotal', 0)
+    swap_free = info.get('SwapFree', 0)
+    
+    def row(label, *values):
+        return f"{label:<8}" + ''.join(f"{human_size(v, 'i'):>12}" for v in values) + "\n"
+    
+    header = f"{'':<8}" + ''.join(f"{h:>12}" for h in ('total', 'used', 'free', 'shared', 'buff/cache', 'available'))
+    return (
+        header + "\n" +
+        row('Mem:', total, total - available, free, info.get('Shmem', 0), cache, available) +
+        row('Swap:', swap_total, swap_total - swap_free, swap_free)
+    )
+
+def uptime_report() -> str:
+    """Equivalent of `uptime`, from /proc/uptime and the load average"""
+    with open('/proc/uptime', 'r') as f:
+        seconds = int(float(f.read().split()[0]))
+    
+    days, rest = divmod(seconds, 86400)
+    hours, minutes = divmod(rest // 60, 60)
+    up = f"{hours}:{minutes:02d}" if hours else f"{minutes} min"
+    if days:
+        up = f"{days} day{'s' if days != 1 else ''}, {up:>5}"
+    
+    load = ', '.join(f"{avg:.2f}" for avg in os.getloadavg())
+    return f" {time.strftime('%H:%M:%S')} up {up},  load average: {load}\n"
+
+HAVE_PROC = os.path.exists('/proc/meminfo')
+
+def tail_bytes(path: str, n: int, block: int = 8192) -> bytes:
+    """Last n lines of a file as raw bytes, reading backwards from the end like tail -n"""
+    if n <= 0:
+        return b''
+    
+    chunks = []
+    newlines = 0
+    with open(path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        # n lines need n+1 newlines when the file ends with one
+        while pos > 0 and newlines <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            newlines += chunk.count(b'\n')
+            chunks.append(chunk)
+    
+    lines = b''.join(reversed(chunks)).splitlines(keepends=True)
+    return b''.join(lines[-n:])
+
+def tail(path: str, n: int, block: int = 8192) -> List[str]:
+    """Last n lines of a file, decoded, like tail -n"""
+    data = tail_bytes(path, n, block)
+    return [line.decode('utf-8', errors='replace') for line in data.splitlines(keepends=True)]
+
+# systemctl, found even when the service's PATH only holds the venv
+_SYSTEMCTL = shutil.which('systemctl', path=os.pathsep.join([os.environ.get('PATH', ''), '/usr/bin', '/bin'])) or 'systemctl'
+# A unit's state is asked again after this many seconds; systemctl may take this long at most
+SERVICE_STATUS_TTL = 30
+SERVICE_STATUS_TIMEOUT = 5
+# unit -> (monotonic time asked, state)
+_service_states: Dict[str, Tuple[float, str]] = {}
+
+def service_status(unit: str) -> str:
+    """systemd's state for unit as `systemctl is-active` reports it (active, activating,
+    failed, ...; unknown if it can't be asked), reused for SERVICE_STATUS_TTL seconds"""
+    now = time.monotonic()
+    cached = _service_states.get(unit)
+    if cached is not None and now - cached[0] < SERVICE_STATUS_TTL:
+        return cached[1]
+    
+    try:
+        # Exits non-zero for every state but active, and prints the state either way
+        state = subprocess.run([_SYSTEMCTL, 'is-active', unit], capture_output=True, text=True,
+                               timeout=SERVICE_STATUS_TIMEOUT).stdout.strip() or 'unknown'
+    except (OSError, subprocess.TimeoutExpired):
+        state = 'unknown'
+    _service_states[unit] = (now, state)
+    return state
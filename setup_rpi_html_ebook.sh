@@ -77,6 +77,7 @@ pip install flask flask-cors requests
 pip install beautifulsoup4 lxml
 pip install pillow
 pip install gunicorn
+pip install orjson
 
 # Create required directories
 print_status "Creating required directories..."
@@ -97,7 +98,7 @@ cat > config.json << EOF
     "api_url": "https://shrinepuzzle.com/api/puzzle_receiver.php",
     "api_key": "shrine_puzzle_api_key_2024",
     "output_dir": "./generated_ebooks",
-    "log_file": "./html_ebook_generation.log",
+    "log_file": "./logs/html_ebook_generation.log",
     "cdn_bunny": {
         "storage_zone": "shrinepuzzle-ebooks",
         "api_key": "your_cdn_bunny_api_key_here",
@@ -112,8 +113,8 @@ cat > config.json << EOF
 EOF
 
 # Create log file
-touch html_ebook_generation.log
-chmod 644 html_ebook_generation.log
+touch logs/html_ebook_generation.log
+chmod 644 logs/html_ebook_generation.log
 
 # Install systemd service
 print_status "Installing systemd service..."
@@ -134,6 +135,13 @@ server {
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_set_header X-Sendfile-Type X-Accel-Redirect;
+    }
+
+    # Ebook downloads handed back by the API with X-Accel-Redirect
+    location /_ebooks/ {
+        internal;
+        alias $PROJECT_DIR/generated_ebooks/;
     }
 }
 EOF
@@ -156,7 +164,7 @@ cat > start_html_ebook_api.sh << 'EOF'
 #!/bin/bash
 cd /home/pi/shrinepuzzle.com/puzzle_generator
 source venv/bin/activate
-python rpi_html_ebook_api.py
+exec gunicorn --worker-class gthread --workers 1 --threads 8 --keep-alive 5 --bind 0.0.0.0:8080 rpi_html_ebook_api:app
 EOF
 
 chmod +x start_html_ebook_api.sh
@@ -265,7 +273,7 @@ echo "   • Service: rpi-html-ebook-api"
 echo "   • API URL: http://localhost:8080"
 echo "   • Nginx: http://$(hostname -I | awk '{print $1}')"
 echo "   • Project Directory: $PROJECT_DIR"
-echo "   • Log File: $PROJECT_DIR/html_ebook_generation.log"
+echo "   • Log File: $PROJECT_DIR/logs/html_ebook_generation.log"
 echo ""
 echo "🔧 Useful Commands:"
 echo "   • Check service status: sudo systemctl status rpi-html-ebook-api"
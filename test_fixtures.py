@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Shared test puzzles for the HTML ebook test scripts
+Layouts are tuples of tuples, built once at import and shared by every caller
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# Shared by both sets
+_EASY_6 = (6, 'easy', (
+    (0, 0, 'X', 'X', 0, 0),
+    (0, 0, 'X', 0, 0, 0),
+    (0, 0, 0, 0, 0, 0),
+    (0, 0, 0, 0, 0, 0),
+    (0, 0, 'X', 0, 0, 0),
+    (0, 'X', 0, 0, 0, 'X'),
+))
+
+# Puzzles used by test_html_ebook.py
+EBOOK_FIXTURES = (
+    _EASY_6,
+    (6, 'medium', (
+        (0, 0, 0, 0, 0, '1'),
+        ('1', 'X', 0, 0, 0, 0),
+        (0, 0, 'X', 'X', 0, 0),
+        (0, 0, 0, 0, 0, 'X'),
+        ('X', 0, 0, '1', 'X', 0),
+        (0, 0, 0, 'X', 0, 0),
+    )),
+    (8, 'hard', (
+        (0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 'X', 0, 0, 0),
+        (0, 0, 0, '2', 0, 0, 0, 'X'),
+        (0, 0, 'X', 0, 0, 0, 0, 0),
+        (0, 0, 0, 'X', 0, 0, 0, 'X'),
+        (0, 0, 'X', 0, 'X', 'X', '1', '1'),
+        (0, 0, 0, '2', 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0),
+    )),
+)
+
+# Puzzles used by test_html_ebook_integration.py (its own medium layout)
+INTEGRATION_FIXTURES = (
+    _EASY_6,
+    (6, 'medium', (
+        (0, 0, 0, 0, 0, '1'),
+        ('1', 'X', 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 'X', '1'),
+        ('1', 0, 0, 0, 0, 0),
+    )),
+)
+
+def make_fixture_puzzles(count: Optional[int] = None, fixtures: Tuple = EBOOK_FIXTURES) -> List[Dict]:
+    """The first count puzzles of fixtures (all by default), as fresh dicts over the shared layouts"""
+    return [{'size': size, 'difficulty': difficulty, 'layout': layout}
+            for size, difficulty, layout in fixtures[:count]]
@@ -6,49 +6,11 @@ Creates a sample HTML ebook with test puzzles
 
 import json
 from html_ebook_generator import HTMLEbookGenerator
+from test_fixtures import make_fixture_puzzles
 
 def create_test_puzzles():
     """Create sample puzzles for testing"""
-    return [
-        {
-            'size': 6,
-            'difficulty': 'easy',
-            'layout': [
-                [0, 0, 'X', 'X', 0, 0],
-                [0, 0, 'X', 0, 0, 0],
-                [0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0],
-                [0, 0, 'X', 0, 0, 0],
-                [0, 'X', 0, 0, 0, 'X']
-            ]
-        },
-        {
-            'size': 6,
-            'difficulty': 'medium',
-            'layout': [
-                [0, 0, 0, 0, 0, '1'],
-                ['1', 'X', 0, 0, 0, 0],
-                [0, 0, 'X', 'X', 0, 0],
-                [0, 0, 0, 0, 0, 'X'],
-                ['X', 0, 0, '1', 'X', 0],
-                [0, 0, 0, 'X', 0, 0]
-            ]
-        },
-        {
-            'size': 8,
-            'difficulty': 'hard',
-            'layout': [
-                [0, 0, 0, 0, 0, 0, 0, 0],
-                [0, 0, 0, 0, 'X', 0, 0, 0],
-                [0, 0, 0, '2', 0, 0, 0, 'X'],
-                [0, 0, 'X', 0, 0, 0, 0, 0],
-                [0, 0, 0, 'X', 0, 0, 0, 'X'],
-                [0, 0, 'X', 0, 'X', 'X', '1', '1'],
-                [0, 0, 0, '2', 0, 0, 0, 0],
-                [0, 0, 0, 0, 0, 0, 0, 0]
-            ]
-        }
-    ]
+    return make_fixture_puzzles()
 
 def main():
     print("🎯 Testing HTML Ebook Generator...")
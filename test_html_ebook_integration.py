@@ -8,6 +8,7 @@ import json
 import requests
 import time
 from datetime import datetime
+from test_fixtures import INTEGRATION_FIXTURES, make_fixture_puzzles
 
 def test_html_ebook_integration():
     """Test the complete HTML ebook generation flow"""
@@ -17,6 +18,12 @@ def test_html_ebook_integration():
     api_key = "shrine_puzzle_api_key_2024"
     hostname = "rpi-5-001"
     
+    # One session for every API call, so they share a single TCP+TLS connection;
+    # connects give up after 3 s so an unreachable server doesn't hang each step
+    session = requests.Session()
+    session.headers.update({'Authorization': f'Bearer {api_key}'})
+    timeout = (3, 30)
+    
     print("🧪 Testing HTML Ebook Integration with Existing Job Queue System")
     print("=" * 70)
     
@@ -37,14 +44,10 @@ def test_html_ebook_integration():
     }
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{web_server_url}/api/queue_command.php",
             json=command_data,
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {api_key}'
-            },
-            timeout=30
+            timeout=timeout
         )
         
         if response.status_code == 200:
@@ -70,11 +73,10 @@ def test_html_ebook_integration():
     print("\n2️⃣ Checking command status...")
     
     try:
-        response = requests.get(
+        response = session.get(
             f"{web_server_url}/api/rpi_commands.php",
-            headers={'Authorization': f'Bearer {api_key}'},
             params={"hostname": hostname},
-            timeout=30
+            timeout=timeout
         )
         
         if response.status_code == 200:
@@ -102,11 +104,10 @@ def test_html_ebook_integration():
     print("\n3️⃣ Checking RPi5 system status...")
     
     try:
-        response = requests.get(
+        response = session.get(
             f"{web_server_url}/api/get_rpi_status.php",
-            headers={'Authorization': f'Bearer {api_key}'},
             params={"hostname": hostname},
-            timeout=30
+            timeout=timeout
         )
         
         if response.status_code == 200:
@@ -150,32 +151,7 @@ def test_html_ebook_integration():
         generator = EnhancedHTMLEbookGenerator(config)
         
         # Create test puzzles
-        test_puzzles = [
-            {
-                'size': 6,
-                'difficulty': 'easy',
-                'layout': [
-                    [0, 0, 'X', 'X', 0, 0],
-                    [0, 0, 'X', 0, 0, 0],
-                    [0, 0, 0, 0, 0, 0],
-                    [0, 0, 0, 0, 0, 0],
-                    [0, 0, 'X', 0, 0, 0],
-                    [0, 'X', 0, 0, 0, 'X']
-                ]
-            },
-            {
-                'size': 6,
-                'difficulty': 'medium',
-                'layout': [
-                    [0, 0, 0, 0, 0, '1'],
-                    ['1', 'X', 0, 0, 0, 0],
-                    [0, 0, 0, 0, 0, 0],
-                    [0, 0, 0, 0, 0, 0],
-                    [0, 0, 0, 0, 'X', '1'],
-                    ['1', 0, 0, 0, 0, 0]
-                ]
-            }
-        ]
+        test_puzzles = make_fixture_puzzles(fixtures=INTEGRATION_FIXTURES)
         
         # Generate test ebook
         import os